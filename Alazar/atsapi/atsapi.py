@@ -19,6 +19,8 @@ from ctypes import *
 import numpy as np
 import os
 
+from dmaBufferPool import DMABufferPool
+
 from sys import version_info
 if version_info.major == 2:
     import thread
@@ -468,6 +470,10 @@ class DMABuffer:
             raise Exception("Unsupported OS")
 
 
+# Pool of DMA buffers shared by all boards
+bufferPool = DMABufferPool(DMABuffer)
+
+
 # Load libraries
 ats = None
 libc = None
@@ -0,0 +1,266 @@
+'''Simulated AlazarTech digitizer.
+
+Drop-in replacement for the subset of the atsapi module used by dataAcq and
+digitizer. The simulated boards fill posted DMA buffers with synthetic
+backscatter I/Q generated by Misc/simFiber.py and, unless disabled in
+simFiber.config, deliver them at the pace of the real hardware (one buffer
+every recordsPerBuffer / fs seconds after startCapture).
+
+Like the hardware, a board raises an exception if buffers are waited for in
+a different order than they were posted, or if no posted buffer is available
+when the next record has to be stored (buffer overflow).
+'''
+
+from ctypes import *
+import collections
+import numpy as np
+import threading
+import time
+import weakref
+
+import simFiber
+from dmaBufferPool import DMABufferPool
+
+'''Constants used by dataAcq and digitizer (same values as in atsapi)'''
+INTERNAL_CLOCK = 0x1
+FAST_EXTERNAL_CLOCK = 0x2
+EXTERNAL_CLOCK_10MHz_REF = 0x7
+SAMPLE_RATE_100MSPS = 0x24
+SAMPLE_RATE_USER_DEF = 0x40
+CLOCK_EDGE_RISING = 0
+CLOCK_EDGE_FALLING = 1
+CHANNEL_A = 1
+CHANNEL_B = 2
+CHANNEL_C = 4
+CHANNEL_D = 8
+ADMA_TRADITIONAL_MODE = 0
+ADMA_NPT = 0x200
+ADMA_CONTINUOUS_MODE = 0x100
+ADMA_EXTERNAL_STARTCAPTURE = 0x1
+ADMA_INTERLEAVE_SAMPLES = 0x1000
+INPUT_RANGE_PM_1_V = 0xA
+INPUT_RANGE_PM_2_V = 0xB
+INPUT_RANGE_PM_4_V = 0xC
+INPUT_RANGE_PM_5_V = 0xD
+AC_COUPLING = 1
+DC_COUPLING = 2
+TRIG_ENGINE_J = 0
+TRIG_ENGINE_K = 1
+TRIG_ENGINE_OP_J = 0
+TRIG_EXTERNAL = 2
+TRIG_DISABLE = 3
+TRIGGER_SLOPE_POSITIVE = 1
+TRIGGER_SLOPE_NEGATIVE = 2
+IMPEDANCE_50_OHM = 2
+ETR_5V = 0
+AUX_OUT_TRIGGER = 0
+AUX_OUT_PACER = 2
+AUX_OUT_SERIAL_DATA = 14
+
+# Page size used to align simulated DMA buffers
+PAGE_SIZE = 4096
+
+# DMA buffers by address (used by the simulated boards to fill posted buffers)
+_buffers = weakref.WeakValueDictionary()
+# Simulated boards by system ID
+_systems = {}
+
+
+class DMABuffer:
+    '''Simulated buffer for DMA transfers.
+
+    Page-aligned host memory exposing the same 'addr', 'size_bytes' and
+    'buffer' members as atsapi.DMABuffer.
+    '''
+    def __init__(self, c_sample_type, size_bytes):
+        self.size_bytes = size_bytes
+
+        npSampleType = {
+            c_uint8: np.uint8,
+            c_uint16: np.uint16,
+            c_uint32: np.uint32,
+            c_int32: np.int32,
+            c_float: np.float32
+        }.get(c_sample_type, 0)
+
+        self.memory = np.empty(size_bytes + PAGE_SIZE, dtype=np.uint8)
+        offset = (-self.memory.ctypes.data) % PAGE_SIZE
+        self.buffer = self.memory[offset:offset+size_bytes].view(npSampleType)
+        self.addr = self.buffer.ctypes.data
+        _buffers[self.addr] = self
+
+    def __exit__(self):
+        _buffers.pop(self.addr, None)
+
+
+# Pool of DMA buffers shared by all boards
+bufferPool = DMABufferPool(DMABuffer)
+
+
+def numOfSystems():
+    return 1
+
+def boardsInSystemBySystemID(sid):
+    return simFiber.config.numInterrogators
+
+
+class Board:
+    '''Simulated digitizer board.
+
+    Board N of a system digitizes the output of simulated DAS interrogator N.
+    Posted buffers are filled by a background thread, which takes the place
+    of the DMA engine of the real board.
+    '''
+    def __init__(self, systemId=1, boardId=1):
+        self.systemId = systemId
+        self.boardId = boardId
+        self.channOffset = 0
+        self.postTriggerSamples = 0
+        self.channelMask = 0
+        self.recordsPerBuffer = 0
+        self.running = False
+        self.fillThread = None
+        self.condition = threading.Condition()
+        self.beforeAsyncRead(0, 0, 0, 0, 0, 0)
+        _systems.setdefault(systemId, {})[boardId] = self
+
+    def instrument(self):
+        return simFiber.opcr.instruments[self.boardId - 1]
+
+    def abortAsyncRead(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.fillThread is not None:
+            self.fillThread.join()
+            self.fillThread = None
+        self.buffersToFill = collections.deque()
+        self.buffersToWait = collections.deque()
+
+    def beforeAsyncRead(self, channels, transferOffset, samplesPerRecord,
+                        recordsPerBuffer, recordsPerAcquisition, flags):
+        self.abortAsyncRead()
+        self.channelMask = channels
+        self.postTriggerSamples = samplesPerRecord
+        self.recordsPerBuffer = recordsPerBuffer
+        self.buffersFilled = 0
+        self.buffersCompleted = 0
+        self.overflow = False
+        self.error = None
+
+    def getChannelInfo(self):
+        return (c_uint32(2**27), c_uint8(14))
+
+    def postAsyncBuffer(self, buffer, bufferLength):
+        with self.condition:
+            self.buffersToFill.append(buffer)
+            self.buffersToWait.append(buffer)
+            self.condition.notify_all()
+
+    def setRecordSize(self, preTriggerSamples, postTriggerSamples):
+        self.postTriggerSamples = postTriggerSamples
+
+    def setTriggerDelay(self, delay_samples):
+        self.channOffset = delay_samples
+
+    def startCapture(self):
+        # The master board starts the capture of all boards in the system
+        startTime = time.perf_counter()
+        for board in _systems[self.systemId].values():
+            board.running = True
+            board.startTime = startTime
+            board.fillThread = threading.Thread(target=board.fillBuffers, daemon=True)
+            board.fillThread.start()
+
+    def bufferPeriod(self):
+        return self.recordsPerBuffer / self.instrument().fs
+
+    # Time at which the board starts filling the given buffer
+    def bufferStartTime(self, bufferNum):
+        return self.startTime + bufferNum * self.bufferPeriod()
+
+    def fillBuffers(self):
+        '''Fills posted buffers in the order they were posted.'''
+        realTime = simFiber.config.realTime
+        with self.condition:
+            while self.running:
+                if len(self.buffersToFill) == 0:
+                    # The board overflows if no buffer is available once the next record has to be stored
+                    timeToStart = self.bufferStartTime(self.buffersFilled) - time.perf_counter()
+                    if realTime and timeToStart < 0:
+                        self.overflow = True
+                        self.condition.notify_all()
+                        return
+                    self.condition.wait(timeToStart if realTime else None)
+                    continue
+                buffer = self.buffersToFill.popleft()
+                self.condition.release()
+                error = None
+                try:
+                    simFiber.fiber.generateRecords(self.instrument(), self.channelMask, self.channOffset, self.postTriggerSamples,
+                                                   self.buffersFilled * self.recordsPerBuffer, self.recordsPerBuffer, _buffers[buffer].buffer)
+                except Exception as e:
+                    error = e
+                finally:
+                    self.condition.acquire()
+                if error is not None:
+                    # Hand the error to the thread waiting for the buffer
+                    self.error = error
+                    self.condition.notify_all()
+                    return
+                self.buffersFilled += 1
+                self.condition.notify_all()
+
+    def waitAsyncBufferComplete(self, buffer, timeout_ms):
+        realTime = simFiber.config.realTime
+        deadline = time.perf_counter() + timeout_ms / 1000
+        with self.condition:
+            if not self.running:
+                raise Exception("Error calling function waitAsyncBufferComplete: acquisition not started")
+            if len(self.buffersToWait) == 0 or self.buffersToWait[0] != buffer:
+                raise Exception("Error calling function waitAsyncBufferComplete: ApiBufferNotReady")
+            while True:
+                if self.overflow:
+                    raise Exception("Error calling function waitAsyncBufferComplete: ApiBufferOverflow")
+                if self.error is not None:
+                    raise self.error
+                now = time.perf_counter()
+                # Buffers are complete once filled and, in real time, once all of their records have been acquired
+                completeTime = self.bufferStartTime(self.buffersCompleted + 1) if realTime else now
+                if self.buffersFilled > self.buffersCompleted and now >= completeTime:
+                    break
+                if now >= deadline:
+                    raise Exception("Error calling function waitAsyncBufferComplete: ApiWaitTimeout")
+                if self.buffersFilled > self.buffersCompleted:
+                    self.condition.wait(min(completeTime, deadline) - now)
+                else:
+                    self.condition.wait(deadline - now)
+            self.buffersToWait.popleft()
+            self.buffersCompleted += 1
+
+    # Clock, input, trigger and LED configuration is accepted without effect
+    def setCaptureClock(self, source, rate, edge, decimation):
+        pass
+
+    def configureAuxIO(self, mode, parameter):
+        pass
+
+    def inputControl(self, channel, coupling, inputRange, impedance):
+        pass
+
+    def inputControlEx(self, channel, coupling, inputRange, impedance):
+        pass
+
+    def setExternalTrigger(self, coupling, range):
+        pass
+
+    def setTriggerOperation(self, operation,
+                            engine1, source1, slope1, level1,
+                            engine2, source2, slope2, level2):
+        pass
+
+    def setTriggerTimeOut(self, timeout_clocks):
+        pass
+
+    def setLED(self, ledState):
+        pass
@@ -0,0 +1,84 @@
+'''Pool of reusable DMA buffers shared by the AlazarTech backends.
+
+Used by atsapi (hardware) and atssim (simulated boards) with the buffer
+class of the backend. Kept in a module of its own, since atsapi loads the
+AlazarTech library when it is imported.
+'''
+
+
+class DMABufferPool:
+    '''Pool of reusable buffers for DMA transfers.
+
+    Buffers are handed out by sample type and size. Released buffers are
+    kept and handed out again by later requests of the same type and size
+    instead of allocating (and page-faulting) new memory for every
+    acquisition. Buffers are freed once the released buffers exceed
+    'maxFreeBytes' (least recently released first) or the pool is cleared.
+
+    Args:
+
+      bufferClass (class): Buffer class of the backend (atsapi.DMABuffer or
+      atssim.DMABuffer), called as bufferClass(c_sample_type, size_bytes).
+
+      maxFreeBytes (int): Maximum number of bytes held by released buffers.
+
+    '''
+    def __init__(self, bufferClass, maxFreeBytes=2**30):
+        self.bufferClass = bufferClass
+        self.maxFreeBytes = maxFreeBytes
+        # Released buffers by (sample type, size) and in order of release
+        self.freeBuffers = {}
+        self.releaseOrder = []
+        # Keys of the buffers handed out, by address
+        self.inUse = {}
+        self.numAllocated = 0
+        self.numReused = 0
+        self.numFreed = 0
+
+    def get(self, c_sample_type, size_bytes):
+        '''Returns a page-aligned DMABuffer of the given sample type and size.'''
+        key = (c_sample_type, size_bytes)
+        if len(self.freeBuffers.get(key, [])) > 0:
+            buffer = self.freeBuffers[key].pop()
+            self.releaseOrder.remove(buffer)
+            self.numReused += 1
+        else:
+            buffer = self.bufferClass(c_sample_type, size_bytes)
+            self.numAllocated += 1
+        self.inUse[buffer.addr] = key
+        return buffer
+
+    def release(self, buffer):
+        '''Hands a buffer back to the pool.'''
+        key = self.inUse.pop(buffer.addr)
+        self.freeBuffers.setdefault(key, []).append(buffer)
+        self.releaseOrder.append(buffer)
+        while self.freeBytes() > self.maxFreeBytes:
+            self.free(self.releaseOrder[0])
+
+    def free(self, buffer):
+        '''Frees a released buffer.'''
+        self.releaseOrder.remove(buffer)
+        for buffers in self.freeBuffers.values():
+            if buffer in buffers:
+                buffers.remove(buffer)
+        buffer.__exit__()
+        self.numFreed += 1
+
+    def clear(self):
+        '''Frees all released buffers.'''
+        while len(self.releaseOrder) > 0:
+            self.free(self.releaseOrder[0])
+
+    def freeBytes(self):
+        return sum([buffer.size_bytes for buffer in self.releaseOrder])
+
+    def statistics(self):
+        '''Returns the pool statistics as dictionary.'''
+        return {'allocated': self.numAllocated,
+                'reused': self.numReused,
+                'freed': self.numFreed,
+                'inUse': len(self.inUse),
+                'inUseBytes': sum([key[1] for key in self.inUse.values()]),
+                'free': len(self.releaseOrder),
+                'freeBytes': self.freeBytes()}
@@ -0,0 +1,34 @@
+'''Tests of the DMA buffer pool with the buffers of the simulated boards.'''
+
+from ctypes import c_uint16
+
+import atssim
+from dmaBufferPool import DMABufferPool
+
+
+def test_reuse():
+    '''Released buffers are handed out again by requests of the same sample type and size.'''
+    pool = DMABufferPool(atssim.DMABuffer)
+    buffers = [pool.get(c_uint16, 8192) for i in range(3)]
+    assert all([buffer.addr % atssim.PAGE_SIZE == 0 for buffer in buffers])
+    for buffer in buffers:
+        pool.release(buffer)
+    reused = [pool.get(c_uint16, 8192) for i in range(3)]
+    other = pool.get(c_uint16, 4096)
+    assert set([buffer.addr for buffer in reused]) == set([buffer.addr for buffer in buffers])
+    assert other.addr not in [buffer.addr for buffer in buffers]
+    assert pool.statistics() == {'allocated': 4, 'reused': 3, 'freed': 0, 'inUse': 4,
+                                 'inUseBytes': 3*8192 + 4096, 'free': 0, 'freeBytes': 0}
+
+
+def test_maxFreeBytes():
+    '''Least recently released buffers are freed once the released buffers exceed maxFreeBytes.'''
+    pool = DMABufferPool(atssim.DMABuffer, maxFreeBytes=2*8192)
+    buffers = [pool.get(c_uint16, 8192) for i in range(3)]
+    for buffer in buffers:
+        pool.release(buffer)
+    assert pool.statistics()['freed'] == 1 and pool.freeBytes() == 2*8192
+    assert buffers[0].addr not in atssim._buffers
+    assert pool.get(c_uint16, 8192).addr == buffers[2].addr
+    pool.clear()
+    assert pool.statistics()['free'] == 0 and pool.statistics()['inUse'] == 1
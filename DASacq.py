@@ -26,5 +26,7 @@ class DASacq:
         
     
 
-DASacqObj = DASacq()
-DASacqObj.window.mainloop()
+# Worker processes (see Misc/channelPool.py) import this script without starting the GUI
+if __name__ == '__main__':
+    DASacqObj = DASacq()
+    DASacqObj.window.mainloop()
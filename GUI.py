@@ -30,6 +30,7 @@ import digitizer
 import interrogator
 import time
 import calibration
+import calibCache
 import diagnostics
 import dataAcq
 import misc
@@ -57,10 +58,16 @@ class GUI(tk.Frame):
     # Fiber End Channel detection results
     fiberEndChann = 0
     fiberSensingRegions = [] 
-    # I/Q Imbalance Correction Results (currently not used)
-    Ioffset = [0,0]
-    Qoffset = [0,0]
-    IQgain = [1,1]
+    # Fiber sensing regions detected by each DAS interrogator (by board number, None = not detected)
+    boardSensingRegions = []
+    # I/Q Imbalance Correction Results of each digitizer board ([laser 1, laser 2]; None = board not calibrated)
+    Ioffset = [None, None]
+    Qoffset = [None, None]
+    IQgain = [None, None]
+    # Apply the I/Q imbalance correction results to the strain output when recording (see dataAcq.storeDataToDisk)
+    daqCorrectIQ = True
+    # Store raw data corrected by the I/Q imbalance correction results when recording
+    daqStoreCorrectedIQ = False
     # Treshold to detect optical activity for EDFA initialization
     thresh_EDFAinit = 0.005
     # Thresholds for fiber sensing region detection
@@ -69,6 +76,10 @@ class GUI(tk.Frame):
     thresh_saturatedChannRatio = 0.02 # 0.2 for passive remote circulator scenario;
     # Handle to pdf file containing plots of calibration results
     calibResultsPdf = None
+    # File holding cached calibration results per interrogator configuration (None = no cache, see calibCache)
+    calibCacheFile = os.path.join(os.path.dirname(__file__), 'calibrationCache.json')
+    # Verify cached calibration results with a short capture before they are used
+    calibCacheVerify = True
     
     ##########################################################################
     # Diagnostics
@@ -87,6 +98,9 @@ class GUI(tk.Frame):
             freqRange = [4000, 5000]
             # Variable holding acoustic noise floor
             medAcousticNoiseFloor = []
+            # Number of worker processes calculating the noise floor of the channels (1 = no worker processes; opt-in, e.g. os.cpu_count(),
+            # the pool is started on first use and kept for later tests, see channelPool.getPool)
+            numWorkers = 1
     # Constructor
     def __init__(self, master=None):
                 
@@ -562,6 +576,7 @@ class GUI(tk.Frame):
             self.isCalibrated[0] = 0
             self.isCalibrated[1] = 0
             self.fiberSensingRegions = []
+            self.boardSensingRegions = []
             self.fiberEndChann = 0
             self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_cross)
             self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image=self.img_cross)
@@ -585,6 +600,7 @@ class GUI(tk.Frame):
             self.isCalibrated[0] = 0
             self.isCalibrated[1] = 0
             self.fiberSensingRegions = []
+            self.boardSensingRegions = []
             self.fiberEndChann = 0
             self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_cross)
             self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image=self.img_cross)
@@ -626,29 +642,59 @@ class GUI(tk.Frame):
             messagebox.showerror('Permission Error', 'Please close PDF file of previous calibration run and try again.')
             return        
         
-        # Amplifier Setup
-        self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_refresh)
-        self.update()
-        for interrogator in self.InterrogatorHandle.interrogators:
-            calibration.amplifierSetup(self, interrogator)
-        # Flag amplifier setup as having completed successfully
-        self.isCalibrated[0] = 1
-        self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_check)
-        self.update()
+        # Use cached calibration results if the interrogator configuration and the fiber have not changed
+        cachedResults = None
+        if self.calibCacheFile is not None:
+            calibKey = calibCache.getKey(self)
+            cachedResults = calibCache.lookup(self.calibCacheFile, calibKey)
+        if cachedResults is not None:
+            self.textWindow.insert(tk.END, 'Verifying cached calibration results (' + cachedResults['time'] + ') ... ')
+            self.textWindow.see(tk.END)
+            self.update()
+            # Applying the cached results changes the DAS sampling frequency and EDFA currents, which are restored if the verification fails
+            previousResults = calibration.getCalibrationResults(self)
+            calibration.applyCalibrationResults(self, cachedResults)
+            if self.calibCacheVerify and not calibration.verifyCalibration(self):
+                cachedResults = None
+                calibration.applyCalibrationResults(self, previousResults)
+                self.textWindow.insert(tk.END, 'failed (previous settings restored)\n')
+            else:
+                self.textWindow.insert(tk.END, 'success\n')
+            self.textWindow.see(tk.END)
         
-        # Fiber End Detection
-        self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image= self.img_refresh)
-        self.update()
-        calibration.fiberEndDetection(self)
-        self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image= self.img_check)
-        self.update()  
+        if cachedResults is not None:
+            self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_check)
+            self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image= self.img_check)
+            self.canvas_IQImbalanceCorrection.itemconfig(self.canvas_img_IQImbalanceCorrection, image=self.img_check)
+            self.update()
+        else:
+            # Amplifier Setup
+            self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_refresh)
+            self.update()
+            for interrogator in self.InterrogatorHandle.interrogators:
+                calibration.amplifierSetup(self, interrogator)
+            # Flag amplifier setup as having completed successfully
+            self.isCalibrated[0] = 1
+            self.canvas_AmplifierSetup.itemconfig(self.canvas_img_amplifierSetup, image=self.img_check)
+            self.update()
+            
+            # Fiber End Detection
+            self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image= self.img_refresh)
+            self.update()
+            calibration.fiberEndDetection(self)
+            self.canvas_fiberEnd.itemconfig(self.canvas_img_fiberEnd, image= self.img_check)
+            self.update()  
 
-        # I/Q Imbalance Correction
-        self.canvas_IQImbalanceCorrection.itemconfig(self.canvas_img_IQImbalanceCorrection, image=self.img_refresh)
-        self.update()
-        # calibration.IQImbalanceCorrection(self)
-        self.canvas_IQImbalanceCorrection.itemconfig(self.canvas_img_IQImbalanceCorrection, image=self.img_check)
-        self.update()        
+            # I/Q Imbalance Correction
+            self.canvas_IQImbalanceCorrection.itemconfig(self.canvas_img_IQImbalanceCorrection, image=self.img_refresh)
+            self.update()
+            calibration.IQImbalanceCorrection(self)
+            self.canvas_IQImbalanceCorrection.itemconfig(self.canvas_img_IQImbalanceCorrection, image=self.img_check)
+            self.update()        
+            # Store calibration results
+            if self.calibCacheFile is not None:
+                calibCache.store(self.calibCacheFile, calibKey, calibration.getCalibrationResults(self))
+            
         # Generate page summarizing digitizer and interrogator settings
         if self.DigitizerHandle.triggerMode == 1:
             triggerMode = 'Rising Edge'
@@ -691,11 +737,20 @@ class GUI(tk.Frame):
         axs3.text(0,0,'Calibration Results:', style='italic', weight='bold', size='large')
         axs3.invert_yaxis()
         axs3.axis('off')
+        IoffsetStr = ''
+        QoffsetStr = ''
+        IQgainStr = ''
+        # Boards without I/Q imbalance correction results are shown as '-'
+        paramsStr = lambda params: '- / -' if params is None else str(params[0]) + ' / ' + str(params[1])
+        for interrogator in self.InterrogatorHandle.interrogators:
+            IoffsetStr = IoffsetStr + paramsStr(self.Ioffset[interrogator.boardNum]) + ' / '
+            QoffsetStr = QoffsetStr + paramsStr(self.Qoffset[interrogator.boardNum]) + ' / '
+            IQgainStr = IQgainStr + paramsStr(self.IQgain[interrogator.boardNum]) + ' / '
         calibration_results = [['Fiber Sensing Region:', str(self.fiberSensingRegions[0][0]) + ' - ' + str(self.fiberSensingRegions[-1][1])],
-                               ['Fiber End Channel (Fine):', str(self.fiberEndChann)]]
-        #                        ['I Offset (Laser 1 / Laser 2):', str(self.Ioffset[0]) + ' / ' + str(self.Ioffset[1])],
-        #                        ['Q Offset (Laser 1 / Laser 2):', str(self.Qoffset[0]) + ' / ' + str(self.Qoffset[1])],
-        #                        ['I/Q Gain (Laser 1 / Laser 2):', str(self.IQgain[0]) + ' / ' + str(self.IQgain[1])]]
+                               ['Fiber End Channel (Fine):', str(self.fiberEndChann)],
+                               ['I Offset (Laser 1 / Laser 2):', IoffsetStr[0:-3]],
+                               ['Q Offset (Laser 1 / Laser 2):', QoffsetStr[0:-3]],
+                               ['I/Q Gain (Laser 1 / Laser 2):', IQgainStr[0:-3]]]
         axs3.table(cellText=calibration_results,  rowLoc='center', colWidths=[.5,.5], colLoc='center', loc='center', bbox=[0,0.33, 1, 0.62])
 
         self.calibResultsPdf.savefig()
@@ -885,7 +940,7 @@ class GUI(tk.Frame):
 
             for interrogator in self.InterrogatorHandle.interrogators:
                 interrogator.enableDither(2, 10)
-            dataAcq.storeDataToDisk(self, int(self.daqStartChann.get()), int(self.daqEndChann.get()), int(self.daqRecDur.get()), 3)
+            dataAcq.storeDataToDisk(self, int(self.daqStartChann.get()), int(self.daqEndChann.get()), int(self.daqRecDur.get()), 3, correctIQ=self.daqCorrectIQ, storeCorrectedIQ=self.daqStoreCorrectedIQ)
             for interrogator in self.InterrogatorHandle.interrogators:
                 interrogator.disableDither()
                 
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:04:46 2026
+
+@author: H131339
+"""
+
+import numpy as np
+
+import transforms
+
+
+# Estimation methods: 'minmax' = offsets and gain from the extremes of the (decimated) I and Q data;
+# 'ellipse' = least-squares fit of an axis-aligned ellipse (does not need the phase to sweep a full circle)
+METHODS = ('minmax', 'ellipse')
+# Samples whose residual exceeds this multiple of the (normalized) median absolute residual of their channel are excluded by the robust fit
+ROBUST_THRESH = 3
+# Number of samples per channel used to estimate the residual scale of the robust fit
+ROBUST_SUBSAMPLES = 256
+# Number of samples per chunk of the ellipse fit
+CHUNK_LEN = 256
+# Number of records of digitizer channels per chunk of the I/Q correction of 16 bit samples (fits in the cache)
+CORRECTION_CHUNK_LEN = 8192
+
+
+# Estimation of the I offset, Q offset and I/Q gain (ratio of the I and Q amplitude) of each channel while its phase is modulated (e.g. by the dither signal)
+# Blocks of shape (time, ...) are processed with all channels (and lasers, e.g. a (time, channel, laser) view) at once and can be added as they are acquired
+class IQimbalanceEstimator:
+
+    # Estimation method (see METHODS)
+    method = 'minmax'
+    # Decimation factor applied to the I/Q data before the estimation
+    decimation = 1
+    # Exclude outliers (samples with large residuals, e.g. fading) from the ellipse fit by a second, weighted fit of each block
+    robust = True
+    # Decimators of I and Q data
+    decimators = []
+    # Running extremes of I and Q data ('minmax')
+    Imax = None
+    Imin = None
+    Qmax = None
+    Qmin = None
+    # Sums of the products of the ellipse fit features ('ellipse')
+    moments = None
+
+    # Constructor
+    def __init__(self, method='minmax', decimation=1, robust=True):
+
+        if method not in METHODS:
+            raise ValueError("Unknown I/Q imbalance estimation method '" + str(method) + "'.")
+        self.method = method
+        self.decimation = decimation
+        self.robust = robust
+        self.reset()
+
+    # Restart the estimation with the next block
+    def reset(self):
+
+        self.decimators = [transforms.polyphaseDecimator(self.decimation) for k in range(2)]
+        self.Imax = None
+        self.Imin = None
+        self.Qmax = None
+        self.Qmin = None
+        self.moments = None
+
+    # Add a block of I and Q data of shape (time, ...)
+    def update(self, I, Q):
+
+        I = self.decimators[0].update(I)
+        Q = self.decimators[1].update(Q)
+        if I.shape[0] == 0:
+            return
+        if self.method == 'minmax':
+            if self.Imax is None:
+                [self.Imax, self.Imin, self.Qmax, self.Qmin] = [np.amax(I, axis=0), np.amin(I, axis=0), np.amax(Q, axis=0), np.amin(Q, axis=0)]
+            else:
+                np.maximum(self.Imax, np.amax(I, axis=0), out=self.Imax)
+                np.minimum(self.Imin, np.amin(I, axis=0), out=self.Imin)
+                np.maximum(self.Qmax, np.amax(Q, axis=0), out=self.Qmax)
+                np.minimum(self.Qmin, np.amin(Q, axis=0), out=self.Qmin)
+        else:
+            moments = getEllipseMoments(I, Q)
+            if self.robust:
+                # Exclude samples with large residuals of the fit of the block (residual scale from a subsample of the block)
+                coeffs = solveEllipse(moments)
+                step = max(1, int(I.shape[0]/ROBUST_SUBSAMPLES))
+                scale = ROBUST_THRESH*1.4826*np.median(np.abs(getEllipseResidual(I[::step], Q[::step], coeffs)), axis=0)
+                moments = getEllipseMoments(I, Q, lambda Ichunk, Qchunk: np.abs(getEllipseResidual(Ichunk, Qchunk, coeffs)) <= scale)
+            if self.moments is None:
+                self.moments = moments
+            else:
+                for key in moments:
+                    self.moments[key] = self.moments[key] + moments[key]
+
+    # Get the I offset, Q offset and I/Q gain of each channel (NaN where the data does not trace an ellipse)
+    def getEstimate(self):
+
+        if self.method == 'minmax':
+            if self.Imax is None:
+                raise ValueError("No data has been processed.")
+            Ioffset = (self.Imax + self.Imin)/2
+            Qoffset = (self.Qmax + self.Qmin)/2
+            with np.errstate(divide='ignore', invalid='ignore'):
+                IQgain = (self.Imax - self.Imin)/(self.Qmax - self.Qmin)
+        else:
+            if self.moments is None:
+                raise ValueError("No data has been processed.")
+            # The fits normalized on I^2 and on Q^2 are averaged, which cancels most of the bias caused by noise
+            # x^2 + c1*y^2 + c2*x + c3*y + c4 = 0: centre (-c2/2, -c3/(2*c1)), ratio of the semi-axes sqrt(c1)
+            coeffsI = solveEllipse(self.moments)
+            # y^2 + d1*x^2 + d2*y + d3*x + d4 = 0: centre (-d3/(2*d1), -d2/2), ratio of the semi-axes 1/sqrt(d1)
+            coeffsQ = solveEllipse(swapMoments(self.moments))
+            valid = (coeffsI[..., 0] > 0) & (coeffsQ[..., 0] > 0)
+            c1 = np.where(valid, coeffsI[..., 0], np.nan)
+            d1 = np.where(valid, coeffsQ[..., 0], np.nan)
+            Ioffset = (-coeffsI[..., 1]/2 - coeffsQ[..., 2]/(2*d1))/2
+            Qoffset = (-coeffsI[..., 2]/(2*c1) - coeffsQ[..., 1]/2)/2
+            IQgain = (c1/d1)**0.25
+
+        return(Ioffset, Qoffset, IQgain)
+
+
+# Correction of the I/Q imbalance of data in ADMA_INTERLEAVE_SAMPLES layout (see IQlayout) streamed in blocks: I' = I - Ioffset, Q' = (Q - Qoffset)*IQgain
+# The parameters are calibrated per DAS interrogator, so each board has its own corrector (see dataAcq.getIQcorrectors)
+class IQcorrector:
+
+    # Offset subtracted from and gain applied to each digitizer channel of a record ([I1, Q1, I2, Q2] or [I, Q]), in units of the samples
+    offsets = None
+    gains = None
+
+    # Constructor
+    # Ioffset, Qoffset, IQgain: parameters of laser 1 and 2 in the range -1 ... +1 (see IQimbalanceEstimator)
+    # laserNum: recorded lasers (1, 2 or 3 = both); scale: scaling of the samples to the range -1 ... +1 (e.g. dataAcq.SAMPLE_SCALE)
+    def __init__(self, Ioffset, Qoffset, IQgain, laserNum=3, scale=1):
+
+        lasers = {1: [0], 2: [1], 3: [0, 1]}[laserNum]
+        self.offsets = np.array([[Ioffset[l]/scale, Qoffset[l]/scale] for l in lasers]).ravel()
+        self.gains = np.array([[1, IQgain[l]] for l in lasers]).ravel()
+
+    # Correct a (time, numChannels*channels) block of data in place; returns the block
+    # Float data is corrected directly, 16 bit samples are corrected in float32 chunks, rounded and saturated to their range
+    def apply(self, data):
+
+        # Assigning the shape raises an error instead of silently correcting a copy of non-contiguous data
+        view = data.view()
+        view.shape = (-1, self.offsets.size)
+        if not np.issubdtype(data.dtype, np.integer):
+            view -= self.offsets.astype(data.dtype)
+            view *= self.gains.astype(data.dtype)
+            return(data)
+        # (sample - sampleOffset - offset)*gain + sampleOffset as a single multiply-add; offset binary samples (raw digitizer data) are centred on 2**15
+        info = np.iinfo(data.dtype)
+        sampleOffset = 2**15 if info.min == 0 else 0
+        gains = self.gains.astype(np.float32)
+        bias = (sampleOffset - (sampleOffset + self.offsets)*self.gains).astype(np.float32)
+        for k in range(0, view.shape[0], CORRECTION_CHUNK_LEN):
+            chunk = view[k:k+CORRECTION_CHUNK_LEN]*gains
+            chunk += bias
+            np.rint(chunk, out=chunk)
+            np.clip(chunk, info.min, info.max, out=chunk)
+            view[k:k+CORRECTION_CHUNK_LEN] = chunk
+
+        return(data)
+
+
+# Function returns the I offset, Q offset and I/Q gain of each channel of I and Q data of shape (time, ...) (see IQimbalanceEstimator)
+# The data is decimated at once (zero phase, see transforms.decimate) instead of block by block
+def getIQImbalance(I, Q, method='minmax', decimation=1, robust=True):
+
+    estimator = IQimbalanceEstimator(method, 1, robust)
+    estimator.update(transforms.decimate(I, decimation), transforms.decimate(Q, decimation))
+
+    return(estimator.getEstimate())
+
+# Function calculates the sums over time of the products of the features of the ellipse fit x^2 + c1*y^2 + c2*x + c3*y + c4 = 0
+# Features: [y^2, x, y, 1] and target -x^2 (with x^4 for the fit normalized on y^2, see swapMoments); the data is processed in chunks of CHUNK_LEN samples to limit the memory of the products
+# getWeights (optional) returns the boolean mask of the samples of a chunk used for the fit
+def getEllipseMoments(I, Q, getWeights=None):
+
+    s = lambda a, b: np.einsum('t...,t...->...', a, b)
+    moments = None
+    for k in range(0, I.shape[0], CHUNK_LEN):
+        x = I[k:k+CHUNK_LEN]
+        y = Q[k:k+CHUNK_LEN]
+        if getWeights is not None:
+            weights = getWeights(x, y)
+            x = np.where(weights, x, 0)
+            y = np.where(weights, y, 0)
+            n = np.count_nonzero(weights, axis=0)
+        else:
+            n = np.full(x.shape[1:], x.shape[0])
+        x2 = x*x
+        y2 = y*y
+        chunkMoments = {'x4': s(x2, x2), 'y4': s(y2, y2), 'x3': s(x, x2), 'y3': s(y, y2), 'x2y2': s(x2, y2), 'x2y': s(y, x2), 'xy2': s(x, y2),
+                        'x2': np.sum(x2, axis=0), 'y2': np.sum(y2, axis=0), 'xy': s(x, y), 'x': np.sum(x, axis=0), 'y': np.sum(y, axis=0), 'n': n}
+        if moments is None:
+            moments = chunkMoments
+        else:
+            for key in moments:
+                moments[key] += chunkMoments[key]
+
+    return(moments)
+
+# Function returns the moments with the roles of x and y swapped (fit normalized on y^2)
+def swapMoments(moments):
+
+    m = moments
+    swapped = {'x4': m['y4'], 'y4': m['x4'], 'x3': m['y3'], 'y3': m['x3'], 'x2y2': m['x2y2'], 'x2y': m['xy2'], 'xy2': m['x2y'],
+               'x2': m['y2'], 'y2': m['x2'], 'xy': m['xy'], 'x': m['y'], 'y': m['x'], 'n': m['n']}
+
+    return(swapped)
+
+# Function solves the normal equations of the ellipse fit for each channel; returns coefficients [c1, c2, c3, c4] along the last axis
+def solveEllipse(moments):
+
+    m = moments
+    A = np.stack([np.stack([m['y4'], m['xy2'], m['y3'], m['y2']], axis=-1),
+                  np.stack([m['xy2'], m['x2'], m['xy'], m['x']], axis=-1),
+                  np.stack([m['y3'], m['xy'], m['y2'], m['y']], axis=-1),
+                  np.stack([m['y2'], m['x'], m['y'], m['n']], axis=-1)], axis=-2)
+    b = -np.stack([m['x2y2'], m['x3'], m['x2y'], m['x2']], axis=-1)
+    # Regularization keeps the equations of channels without signal solvable
+    A = A + 1e-12*np.eye(4)*np.maximum(np.trace(A, axis1=-2, axis2=-1), 1)[..., None, None]
+    coeffs = np.linalg.solve(A, b[..., None])[..., 0]
+
+    return(coeffs)
+
+# Function returns the algebraic residual of the ellipse fit for each sample
+def getEllipseResidual(I, Q, coeffs):
+
+    residual = I*I + coeffs[..., 0]*Q*Q + coeffs[..., 1]*I + coeffs[..., 2]*Q + coeffs[..., 3]
+
+    return(residual)
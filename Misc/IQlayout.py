@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Zero-copy access to the I/Q data of the ATS9440 ADMA_INTERLEAVE_SAMPLES layout
+
+Each record holds the samples of all enabled digitizer channels interleaved
+sample by sample: [A1, B1, C1, D1, A2, B2, C2, D2, ...] = [I1, Q1, I2, Q2]
+of laser 1 and 2 for every DAS channel (or [I, Q] if a single laser is
+recorded). The functions below return (time, channel) views of this layout
+without copying the data, including the last DAS channel.
+"""
+
+import numpy as np
+
+
+# Function returns a view of shape (..., channel, numChannels) of data in ADMA_INTERLEAVE_SAMPLES layout
+# data: (time, numChannels*channels) matrix, a single record or a DMA buffer
+# numChannels: number of digitizer channels (4 = laser 1 & 2, 2 = single laser)
+# channOffset: number of DAS channels to drop at the start and at the end
+def getChannelView(data, numChannels=4, channOffset=[0, 0]):
+
+    if data.shape[-1] % numChannels != 0:
+        raise ValueError("Record length is not a multiple of the number of digitizer channels.")
+    view = data.reshape(data.shape[:-1] + (int(data.shape[-1]/numChannels), numChannels))
+    view = view[..., channOffset[0]:view.shape[-2]-channOffset[1], :]
+
+    return(view)
+
+# Function returns lists holding zero-copy (time, channel) views of the I and Q data of each laser
+# data can be a single data matrix or a list holding one data matrix per board; lasers are ordered board by board
+def getIQ(data, numChannels=4, channOffset=[0, 0]):
+
+    if not isinstance(data, list):
+        data = [data]
+    I = []
+    Q = []
+    for boardData in data:
+        view = getChannelView(boardData, numChannels, channOffset)
+        for laser in range(int(numChannels/2)):
+            I.append(view[..., 2*laser])
+            Q.append(view[..., 2*laser+1])
+
+    return(I, Q)
+
+# Function returns list holding (time, channel) views of the I/Q data of each laser as complex numbers (I + jQ)
+# Float32 and float64 data are viewed as complex64 and complex128 without copying
+# Raw digitizer data (unsigned 16 bit) and signed 16 bit samples (see dataAcq.signedData) are converted to complex64 in the range -1 ... +1
+def getComplexIQ(data, numChannels=4, channOffset=[0, 0]):
+
+    if not isinstance(data, list):
+        data = [data]
+    IQ = []
+    for boardData in data:
+        if boardData.dtype == np.float32 or boardData.dtype == np.float64:
+            complexData = np.ascontiguousarray(boardData).view(np.complex64 if boardData.dtype == np.float32 else np.complex128)
+        else:
+            view = getChannelView(boardData, numChannels)
+            complexData = np.empty(view.shape[:-1] + (int(numChannels/2),), dtype=np.complex64)
+            complexData.real = view[..., 0::2]
+            complexData.imag = view[..., 1::2]
+            if boardData.dtype == np.uint16:
+                complexData -= (2**15 + 2**15*1j)
+            complexData /= 2**15
+            complexData = complexData.reshape(view.shape[:-2] + (-1,))
+        view = getChannelView(complexData, int(numChannels/2), channOffset)
+        for laser in range(int(numChannels/2)):
+            IQ.append(view[..., laser])
+
+    return(IQ)
+
+# Function returns (time, channel) I and Q data holding the maximum of laser 1 and laser 2
+# Both are views of a single matrix computed in one pass; for single laser data the views of the data are returned
+def getMaxIQ(data, numChannels=4, channOffset=[0, 0]):
+
+    view = getChannelView(data, numChannels, channOffset)
+    if numChannels == 2:
+        return(view[..., 0], view[..., 1])
+    # Reshape to (..., channel, laser, I/Q) and take maximum over lasers
+    view = view.reshape(view.shape[:-1] + (2, 2))
+    IQmax = np.max(view, axis=-2)
+
+    return(IQmax[..., 0], IQmax[..., 1])
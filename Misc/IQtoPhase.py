@@ -7,6 +7,11 @@ Created on Mon Dec  4 14:06:56 2017
 
 import numpy as np
 
+
+# Number of channels processed at once by getWeightedPhaseDataAll (limits the memory of the temporaries)
+CHUNK_CHANNS = 32
+
+
 def getWeightedPhaseData(I, Q, channel):
 
     # Laser 1
@@ -30,13 +35,161 @@ def getWeightedPhaseData(I, Q, channel):
     
     return(weightedPhaseData)
 
+# Function calculates the weighted phase of all DAS channels in one pass
+# I and Q are lists holding one (time, channel) matrix per laser; the weighted and unwrapped phase is returned as (time, channel) matrix
+# scale converts the I/Q data to the range -1 ... +1 (e.g. dataAcq.SAMPLE_SCALE for signed 16 bit samples)
+# Integer and float32 I/Q data is processed in float32, float64 I/Q data in float64; the phase steps are summed in float64 (as phaseUnwrapper)
+# The channels are processed in chunks of CHUNK_CHANNS
+def getWeightedPhaseDataAll(I, Q, scale=1):
+
+    dtype = np.result_type(I[0].dtype, np.float32)
+    weightedPhaseData = np.empty(I[0].shape)
+    for k in range(0, I[0].shape[1], CHUNK_CHANNS):
+        chunk = slice(k, k+CHUNK_CHANNS)
+        for i in range(len(I)):
+            # Laser i: phase steps (see phaseUnwrapper.getSteps) weighted by the power
+            phaseSteps = phaseUnwrapper().getSteps(I[i][:, chunk], Q[i][:, chunk])
+            qualityFact = getPower(I[i][:, chunk], Q[i][:, chunk], scale)
+            qualityFact += dtype.type(0.0001)
+            phaseSteps *= qualityFact
+            if i == 0:
+                weightedPhaseSteps = phaseSteps
+                qualityFactAccum = qualityFact
+            else:
+                weightedPhaseSteps += phaseSteps
+                qualityFactAccum += qualityFact
+
+        # Normalize weighted stack
+        weightedPhaseSteps /= qualityFactAccum
+        np.cumsum(weightedPhaseSteps, axis=0, dtype=np.float64, out=weightedPhaseData[:, chunk])
 
-def getPhaseData(I,Q):
+    return(weightedPhaseData)
+
+
+# Function calculates the unwrapped phase along the time axis (axis 0) of I/Q data
+# The phase does not depend on the scaling of the I/Q data, so integer samples can be used without rescaling
+def getPhaseData(I, Q, axis=0):
     
-    phaseData = np.unwrap(np.arctan2(Q,I))
+    phaseData = np.unwrap(np.arctan2(Q,I), axis=axis)
     
     return(phaseData)
 
+# Function calculates the power I^2 + Q^2 of I/Q data scaled by scale
+# Integer samples are converted to float32 first (their squares would overflow)
+def getPower(I, Q, scale=1):
+
+    dtype = np.result_type(I.dtype, np.float32)
+    I = I.astype(dtype, copy=False)
+    Q = Q.astype(dtype, copy=False)
+    power = I*I
+    power += Q*Q
+    if scale != 1:
+        power *= dtype.type(scale*scale)
+
+    return(power)
+
+# Incremental phase unwrapping of I/Q data streamed in blocks
+# The phase step of each sample is the difference of the wrapped phases arctan2(Q, I) of successive samples, wrapped to -pi ... pi
+# (as np.unwrap); it does not depend on the phase accumulated so far. Only the wrapped phase and the unwrapped phase (float64) of the
+# last sample are carried, so that the precision does not degrade on streams of unbounded length. Successive blocks give the same
+# phase as getPhaseData applied to all samples at once (up to rounding)
+class phaseUnwrapper:
+
+    # Wrapped phase of the last sample of each channel
+    lastWrappedPhase = None
+    # Unwrapped phase of the last sample of each channel (float64)
+    lastPhase = None
+
+    # Constructor
+    def __init__(self):
+
+        self.reset()
+
+    # Restart unwrapping with the next block
+    def reset(self):
+
+        self.lastWrappedPhase = None
+        self.lastPhase = None
+
+    # Returns the phase step of each sample of a (time, channel) block of I/Q data (first sample of the first block: its phase)
+    # Integer and float32 I/Q data is processed in float32, float64 I/Q data in float64
+    def getSteps(self, I, Q):
+
+        dtype = np.result_type(I.dtype, np.float32)
+        phase = np.arctan2(Q.astype(dtype, copy=False), I.astype(dtype, copy=False))
+        steps = np.empty(phase.shape, dtype=dtype)
+        steps[1:] = phase[1:] - phase[:-1]
+        # The first sample of the first block keeps its phase
+        first = 1 if self.lastWrappedPhase is None else 0
+        steps[0] = phase[0] if self.lastWrappedPhase is None else phase[0] - self.lastWrappedPhase
+        self.lastWrappedPhase = phase[-1].copy()
+        # Wrap steps of at least pi to -pi ... pi (pi if the phase difference is positive, as np.unwrap)
+        pi = dtype.type(np.pi)
+        wraps = np.nonzero(np.abs(steps[first:]) >= pi)
+        wraps = (wraps[0] + first,) + wraps[1:]
+        d = steps[wraps]
+        dd = np.mod(d + pi, 2*pi) - pi
+        steps[wraps] = np.where((dd == -pi) & (d > 0), pi, dd)
+
+        return(steps)
+
+    # Returns the unwrapped phase (float64) of a (time, channel) block of I/Q data
+    def update(self, I, Q):
+
+        phaseData = np.cumsum(self.getSteps(I, Q), axis=0, dtype=np.float64)
+        if self.lastPhase is not None:
+            phaseData += self.lastPhase
+        self.lastPhase = phaseData[-1].copy()
+
+        return(phaseData)
+
+# Incremental weighted phase of I/Q data streamed in blocks (see getWeightedPhaseDataAll)
+# Weights the phase steps of each laser (see phaseUnwrapper.getSteps) and keeps the last weighted phase of each channel (float64)
+class weightedPhaseUnwrapper:
+
+    # Phase unwrapper of each laser
+    unwrappers = []
+    # Last weighted phase of each channel (float64)
+    lastWeightedPhase = None
+    # Scaling of the I/Q data to the range -1 ... +1
+    scale = 1
+
+    # Constructor
+    def __init__(self, numLasers, scale=1):
+
+        self.unwrappers = [phaseUnwrapper() for i in range(numLasers)]
+        self.scale = scale
+        self.reset()
+
+    # Restart with the next block
+    def reset(self):
+
+        for unwrapper in self.unwrappers:
+            unwrapper.reset()
+        self.lastWeightedPhase = None
+
+    # Returns the weighted phase (float64) of a block; I and Q are lists holding one (time, channel) block per laser
+    def update(self, I, Q):
+
+        for i in range(len(I)):
+            phaseSteps = self.unwrappers[i].getSteps(I[i], Q[i])
+            qualityFact = getPower(I[i], Q[i], self.scale) + 0.0001
+            if i == 0:
+                weightedPhaseSteps = qualityFact*phaseSteps
+                qualityFactAccum = qualityFact
+            else:
+                weightedPhaseSteps += qualityFact*phaseSteps
+                qualityFactAccum += qualityFact
+
+        # Normalize weighted stack and continue from the last weighted phase
+        weightedPhaseSteps /= qualityFactAccum
+        weightedPhaseData = np.cumsum(weightedPhaseSteps, axis=0, dtype=np.float64)
+        if self.lastWeightedPhase is not None:
+            weightedPhaseData += self.lastWeightedPhase
+        self.lastWeightedPhase = weightedPhaseData[-1].copy()
+
+        return(weightedPhaseData)
+
 # Function converts from phase in radians to pico strain
 def phaseToStrain(phaseData, refractiveIndex, ITUchannel, gaugeLength):
     # Constants
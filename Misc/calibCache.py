@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:58:15 2026
+
+@author: H131339
+"""
+
+import json
+import os
+import time
+
+
+# Calibration results (DAS sampling frequency, EDFA currents, fiber sensing regions, fiber end, I/Q imbalance) are stored in a JSON file by configuration (see getKey)
+# Version of the cache file format
+CACHE_VERSION = 3
+
+
+# Function returns the key of the current configuration of the DAS interrogators and the digitizer
+# The DAS sampling frequency is not part of the key, it is a result of the calibration (see calibration.optimizeDASfs)
+def getKey(gui):
+
+    key = {'interrogators': [interrogator.name for interrogator in gui.InterrogatorHandle.interrogators],
+           'gaugeLength': [interrogator.gaugeLength for interrogator in gui.InterrogatorHandle.interrogators],
+           'pulseWidth': gui.InterrogatorHandle.pulseWidth,
+           'clockMode': gui.DigitizerHandle.clockMode}
+
+    return(json.dumps(key, sort_keys=True))
+
+# Function reads the cache file (returns an empty cache if the file does not exist or has a different version)
+def loadCache(fileName):
+
+    try:
+        with open(fileName, 'r') as fid:
+            cache = json.load(fid)
+    except (OSError, ValueError):
+        return({'version': CACHE_VERSION, 'entries': {}})
+    if cache.get('version') != CACHE_VERSION:
+        return({'version': CACHE_VERSION, 'entries': {}})
+
+    return(cache)
+
+# Function writes the cache file (replaced in one step, so that an interrupted write does not corrupt it)
+def saveCache(fileName, cache):
+
+    tmpFileName = fileName + '.tmp'
+    with open(tmpFileName, 'w') as fid:
+        json.dump(cache, fid, indent=2)
+    os.replace(tmpFileName, fileName)
+
+# Function returns the cached calibration results for a key (None if there are none)
+# The fiber may have changed since, so the results need to be verified before they are used (see calibration.verifyCalibration)
+def lookup(fileName, key):
+
+    return(loadCache(fileName)['entries'].get(key))
+
+# Function stores calibration results for a key (results have to be serializable to JSON, see calibration.getCalibrationResults)
+def store(fileName, key, results):
+
+    cache = loadCache(fileName)
+    results = dict(results)
+    results['time'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    cache['entries'][key] = results
+    saveCache(fileName, cache)
+
+# Function removes the cached calibration results for a key
+def remove(fileName, key):
+
+    cache = loadCache(fileName)
+    if cache['entries'].pop(key, None) is not None:
+        saveCache(fileName, cache)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel per-channel processing of acquired data
+
+A channelPool shards the DAS channels of a data segment across a pool of
+worker processes. The segment is copied once into shared memory, which the
+workers map instead of receiving a pickled copy. Each worker processes its
+contiguous range of channels and the results are concatenated in channel
+order, so the result does not depend on the number of workers.
+
+Functions run by the workers have to be defined at module level (they are
+passed to the workers by name) and take the segment, the channel slice of
+the shard and further arguments:
+
+    result = func(segment, channSlice, *args)    # (..., channel) array
+
+Starting the workers is expensive (on Windows each worker is spawned and
+re-imports the main script), so getPool keeps a single pool alive across
+calls; it is shut down when the interpreter exits.
+
+Note: worker processes are started with the 'spawn' method on Windows, so the
+main script needs to be protected by 'if __name__ == "__main__":'.
+"""
+
+import atexit
+import concurrent.futures
+import os
+import numpy as np
+from multiprocessing import shared_memory
+
+import IQlayout
+import IQtoPhase
+import transforms
+
+
+# Pool kept alive across calls (see getPool)
+sharedPool = None
+
+
+class channelPool:
+
+    # Number of worker processes
+    numWorkers = 1
+    # Process pool executing the shards
+    executor = None
+    # Shared memory block holding the current segment (reused while the segment size does not change)
+    sharedMem = None
+
+    # Constructor
+    # numWorkers: number of worker processes (default: number of CPU cores)
+    def __init__(self, numWorkers=None):
+
+        self.numWorkers = os.cpu_count() if numWorkers is None else numWorkers
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.numWorkers)
+        self.sharedMem = None
+
+    # Apply func to numChanns channels of the segment, split into one shard per worker
+    # Returns the results of all shards concatenated along the last axis
+    def map(self, func, segment, numChanns, args=()):
+
+        # Copy segment into shared memory
+        if self.sharedMem is None or self.sharedMem.size < segment.nbytes:
+            self.releaseSharedMem()
+            self.sharedMem = shared_memory.SharedMemory(create=True, size=max(segment.nbytes, 1))
+        sharedSegment = np.ndarray(segment.shape, dtype=segment.dtype, buffer=self.sharedMem.buf)
+        sharedSegment[:] = segment
+        del sharedSegment
+
+        # Contiguous channel ranges of similar size, in channel order
+        bounds = np.linspace(0, numChanns, min(self.numWorkers, numChanns) + 1).astype(int)
+        futures = []
+        for k in range(len(bounds)-1):
+            futures.append(self.executor.submit(runShard, func, self.sharedMem.name, segment.shape, segment.dtype.str, slice(bounds[k], bounds[k+1]), args))
+        results = [future.result() for future in futures]
+
+        return(np.concatenate(results, axis=-1))
+
+    # Free the shared memory block
+    def releaseSharedMem(self):
+
+        if self.sharedMem is not None:
+            self.sharedMem.close()
+            self.sharedMem.unlink()
+            self.sharedMem = None
+
+    # Shut down the worker processes and free the shared memory
+    def close(self):
+
+        self.executor.shutdown()
+        self.releaseSharedMem()
+
+
+# Function returns the pool kept alive across calls, started with numWorkers worker processes on first use
+# The pool is restarted if a different number of workers is requested
+def getPool(numWorkers):
+
+    global sharedPool
+    if sharedPool is not None and sharedPool.numWorkers != numWorkers:
+        closePool()
+    if sharedPool is None:
+        sharedPool = channelPool(numWorkers)
+
+    return(sharedPool)
+
+# Function shuts down the pool kept alive across calls
+@atexit.register
+def closePool():
+
+    global sharedPool
+    if sharedPool is not None:
+        sharedPool.close()
+        sharedPool = None
+
+
+# Function executed by the worker processes: maps the shared segment and applies func to a channel shard
+def runShard(func, sharedMemName, shape, dtype, channSlice, args):
+
+    sharedMem = shared_memory.SharedMemory(name=sharedMemName)
+    try:
+        segment = np.ndarray(shape, dtype=np.dtype(dtype), buffer=sharedMem.buf)
+        result = np.array(func(segment, channSlice, *args))
+        del segment
+    finally:
+        sharedMem.close()
+
+    return(result)
+
+
+##################################################################################
+# SHARD FUNCTIONS
+##################################################################################
+# Function calculates the acoustic noise floor in dB of the channels in channSlice for a segment of raw data
+# segment holds the uint16 data of numBoards boards side by side (laser 1 & 2); channSlice selects channels after removing channOffset
+# Returns (numOutputs, channel) matrix: the phase of each laser, the weighted phase of each DAS interrogator (dual-laser)
+# and, for two interrogators, the weighted phase of the DAS interrogator assembly (quad-laser)
+def getNoiseFloorShard(segment, channSlice, numBoards, channOffset, fs, freqRange):
+
+    # I/Q data of the shard (normalized to -1 ... +1)
+    boardSize = int(segment.shape[1]/numBoards)
+    I = []
+    Q = []
+    for j in range(numBoards):
+        view = IQlayout.getChannelView(segment[:, j*boardSize:(j+1)*boardSize], 4, channOffset)[:, channSlice, :]
+        view = (view - 2.0**15) / 2**15
+        for laser in range(2):
+            I.append(view[..., 2*laser])
+            Q.append(view[..., 2*laser+1])
+
+    phaseData = []
+    for k in range(len(I)):
+        phaseData.append(IQtoPhase.getPhaseData(I[k], Q[k]))
+    for k in range(numBoards):
+        phaseData.append(IQtoPhase.getWeightedPhaseDataAll([I[2*k], I[2*k+1]], [Q[2*k], Q[2*k+1]]))
+    if numBoards == 2:
+        phaseData.append(IQtoPhase.getWeightedPhaseDataAll(I, Q))
+
+    # Median of the periodogram in dB within the frequency range
+    [P, F] = transforms.periodogram(np.stack(phaseData), fs, axis=1)
+    ind1 = np.ravel(np.nonzero(np.floor(F) == freqRange[0]))
+    ind2 = np.ravel(np.nonzero(np.floor(F) == freqRange[1]))
+
+    return(np.median(10*np.log10(P[:, ind1[0]:ind2[0], :]), axis=1))
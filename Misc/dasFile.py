@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:11:40 2026
+
+@author: H131339
+"""
+
+import json
+import math
+import struct
+import numpy as np
+
+
+# Recording file (*.das): preamble, JSON header, page-aligned data section holding the DMA buffers in the order of the RAW files, index behind the data
+# Magic number identifying DAS recording files
+MAGIC = b'DASREC\r\n'
+# Current format version
+VERSION = 1
+# Preamble: magic, version, header length, data offset, index offset, number of index entries
+PREAMBLE_FORMAT = '<8sIIQQQ'
+PREAMBLE_SIZE = 64
+# Alignment of the data section (allows memory mapping of whole pages)
+DATA_ALIGNMENT = 4096
+# Index entry of a chunk (written when the recording is closed; timestamp: completion time in seconds since the epoch)
+INDEX_DTYPE = np.dtype([('buffer', '<u8'), ('board', '<u4'), ('crc32', '<u4'), ('offset', '<u8'), ('timestamp', '<f8')])
+
+
+class dasFileWriter:
+
+    # File name
+    fileName = ''
+    # Recording header
+    header = {}
+    # Byte offset of the data section
+    dataOffset = 0
+    # Size of the data section allocated so far in bytes
+    dataSize = 0
+    # Index entries [bufferNum, board, offset, timestamp] of all chunks written so far
+    index = []
+
+    # Constructor
+    # The header needs to hold at least 'numBoards', 'buffersPerSecond' and 'bytesPerBuffer'
+    def __init__(self, fileName, header):
+
+        self.fileName = fileName
+        self.header = dict(header)
+        self.header['formatVersion'] = VERSION
+        self.index = []
+        headerBytes = json.dumps(self.header, indent=1).encode('utf-8')
+        self.dataOffset = DATA_ALIGNMENT * math.ceil((PREAMBLE_SIZE + len(headerBytes))/DATA_ALIGNMENT)
+        self.dataSize = 0
+        with open(self.fileName, 'wb') as fid:
+            fid.write(packPreamble(len(headerBytes), self.dataOffset, 0, 0))
+            fid.write(headerBytes)
+            fid.truncate(self.dataOffset)
+
+    # Get byte offset of chunk (bufferNum, board)
+    def getChunkOffset(self, bufferNum, board):
+        return(getChunkOffset(self.header, self.dataOffset, bufferNum, board))
+
+    # Extend the file such that it can hold the given second of data
+    def allocateSecond(self, second):
+
+        secondSize = self.header['buffersPerSecond'] * self.header['numBoards'] * self.header['bytesPerBuffer']
+        self.dataSize = max(self.dataSize, (second+1) * secondSize)
+        with open(self.fileName, 'r+b') as fid:
+            fid.truncate(self.dataOffset + self.dataSize)
+
+    # Register chunk (bufferNum, board) completed at the given time and return its byte offset
+    def addChunk(self, bufferNum, board, timestamp):
+
+        offset = self.getChunkOffset(bufferNum, board)
+        self.index.append([bufferNum, board, offset, timestamp])
+
+        return(offset)
+
+    # Write the index behind the data and finalize the preamble
+    # 'checksums' maps chunk offsets to the CRC32 of their content (None = no checksums)
+    def close(self, checksums=None):
+
+        if checksums is None:
+            checksums = {}
+        index = np.zeros(len(self.index), dtype=INDEX_DTYPE)
+        for i in range(len(self.index)):
+            [bufferNum, board, offset, timestamp] = self.index[i]
+            index[i] = (bufferNum, board, checksums.get(offset, 0), offset, timestamp)
+        indexOffset = self.dataOffset + self.dataSize
+        with open(self.fileName, 'r+b') as fid:
+            fid.seek(indexOffset)
+            fid.write(index.tobytes())
+            fid.truncate()
+            preamble = readPreamble(fid)
+            fid.seek(0)
+            fid.write(packPreamble(preamble['headerLength'], self.dataOffset, indexOffset, index.size))
+
+
+# Function packs the file preamble
+def packPreamble(headerLength, dataOffset, indexOffset, indexCount):
+
+    preamble = struct.pack(PREAMBLE_FORMAT, MAGIC, VERSION, headerLength, dataOffset, indexOffset, indexCount)
+
+    return(preamble.ljust(PREAMBLE_SIZE, b'\0'))
+
+# Function reads the preamble from an open file
+def readPreamble(fid):
+
+    fid.seek(0)
+    [magic, version, headerLength, dataOffset, indexOffset, indexCount] = struct.unpack(PREAMBLE_FORMAT, fid.read(struct.calcsize(PREAMBLE_FORMAT)))
+    if magic != MAGIC:
+        raise ValueError("Not a DAS recording file.")
+    if version > VERSION:
+        raise ValueError("DAS recording file version " + str(version) + " is not supported.")
+
+    return({'version': version, 'headerLength': headerLength, 'dataOffset': dataOffset, 'indexOffset': indexOffset, 'indexCount': indexCount})
+
+# Function reads the preamble and header of a DAS recording file
+def readHeader(fileName):
+
+    with open(fileName, 'rb') as fid:
+        preamble = readPreamble(fid)
+        fid.seek(PREAMBLE_SIZE)
+        header = json.loads(fid.read(preamble['headerLength']).decode('utf-8'))
+
+    return(header, preamble)
+
+# Function reads the chunk index of a DAS recording file
+# Returns an empty index if the recording has not been closed
+def readIndex(fileName):
+
+    with open(fileName, 'rb') as fid:
+        preamble = readPreamble(fid)
+        fid.seek(preamble['indexOffset'])
+        index = np.fromfile(fid, dtype=INDEX_DTYPE, count=preamble['indexCount'])
+
+    return(index)
+
+# Function returns the byte offset of chunk (bufferNum, board)
+# Each second holds [Buffer 1 (Board 1), Buffer 1 (Board 2), Buffer 2 (Board 1), ...]; a chunk holds recordsPerBuffer records in the header's layout
+def getChunkOffset(header, dataOffset, bufferNum, board):
+    return(dataOffset + (bufferNum*header['numBoards'] + board)*header['bytesPerBuffer'])
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:15:15 2026
+
+@author: H131339
+"""
+
+import collections
+import os
+import zlib
+import numpy as np
+
+import dasFile
+import IQlayout
+
+
+# Maximum number of RAW files kept memory mapped at the same time
+MAX_OPEN_FILES = 64
+# Sample types of recording files (header 'sampleType')
+SAMPLE_TYPES = {'uint16': np.uint16, 'int16': np.int16, 'float32': np.float32, 'float64': np.float64}
+# Layouts of recording files (header 'layout'): I/Q data of the digitizer channels interleaved (see IQlayout) or one sample per DAS channel
+LAYOUTS = ('ADMA_INTERLEAVE_SAMPLES', 'TIME_CHANNEL')
+
+
+# Memory-mapped reader of recording files (*.das) and legacy recording directories (recInfo.txt and RAW/dataNNNN.bin)
+# Only the accessed data is read, e.g. rec.getView(0, 0)[rec.getTimeSlice(60, 70), rec.getChannSlice(1000, 1500)]
+class dasReader:
+
+    # Recording file or directory
+    path = ''
+    # Recording header (see dasFile; derived from recInfo.txt for RAW recordings)
+    header = {}
+    # Chunk index (DAS recording files only)
+    index = None
+    # Number of digitizer channels per DAS channel (4 = laser 1 & 2, 2 = single laser, 1 = TIME_CHANNEL layout)
+    numChannels = 4
+    # Number of signals per DAS channel and board (lasers, 1 for TIME_CHANNEL layout)
+    numLasers = 2
+    # Data type of the samples
+    dtype = np.dtype(np.uint16)
+    # Number of recorded DAS channels
+    numChanns = 0
+    # Number of complete DMA buffers (per board) in the recording
+    numBuffers = 0
+    # Number of time samples per DAS channel
+    numSamples = 0
+    # Memory map of the data section of the recording file (numBuffers, numBoards, recordsPerBuffer, numChanns*numChannels)
+    # (sample type as given by the header)
+    data = None
+    # Memory maps of RAW files by second (buffersPerSecond, numBoards, recordsPerBuffer, numChanns*numChannels)
+    rawFiles = None
+    # RAW files (one per second of data)
+    rawFileNames = []
+
+    # Constructor
+    # path: recording file (*.das) or recording directory (holding recording.das or recInfo.txt and RAW)
+    # laserNum: laser recorded in single laser RAW recordings (not stored in recInfo.txt)
+    # bufferCount: number of buffers per second of RAW recordings
+    def __init__(self, path, laserNum=1, bufferCount=10):
+
+        self.path = path
+        if os.path.isdir(path) and os.path.isfile(os.path.join(path, 'recording.das')):
+            path = os.path.join(path, 'recording.das')
+        if os.path.isdir(path):
+            self.openRaw(path, laserNum, bufferCount)
+        else:
+            self.openDas(path)
+        self.numLasers = max(1, int(self.numChannels/2))
+        self.numSamples = self.numBuffers * self.header['recordsPerBuffer']
+
+    # Memory map a DAS recording file
+    def openDas(self, fileName):
+
+        [self.header, preamble] = dasFile.readHeader(fileName)
+        self.index = dasFile.readIndex(fileName)
+        if self.header.get('layout') not in LAYOUTS:
+            raise ValueError("Unsupported layout '" + str(self.header.get('layout')) + "' (supported: " + ', '.join(LAYOUTS) + ").")
+        if self.header.get('sampleType') not in SAMPLE_TYPES:
+            raise ValueError("Unsupported sample type '" + str(self.header.get('sampleType')) + "' (supported: " + ', '.join(SAMPLE_TYPES) + ").")
+        self.dtype = np.dtype(SAMPLE_TYPES[self.header['sampleType']])
+        self.numChannels = 1 if self.header['layout'] == 'TIME_CHANNEL' else len(self.header['digitizerChannels'])
+        self.numChanns = self.header['lastChann'] - self.header['firstChann'] + 1
+        numBoards = self.header['numBoards']
+        bufferSize = numBoards * self.header['bytesPerBuffer']
+        # Buffers are written in order, so a closed recording holds all buffers in the index
+        # An unclosed recording (no index) holds at most the buffers allocated in the file
+        if preamble['indexCount'] > 0:
+            self.numBuffers = int(preamble['indexCount'] / numBoards)
+        else:
+            self.numBuffers = int((os.path.getsize(fileName) - preamble['dataOffset']) / bufferSize)
+        if self.numBuffers > 0:
+            self.data = np.memmap(fileName, dtype=self.dtype, mode='r', offset=preamble['dataOffset'],
+                                  shape=(self.numBuffers, numBoards, self.header['recordsPerBuffer'], self.numChanns*self.numChannels))
+
+    # Memory map a legacy recording directory (recInfo.txt and RAW/dataNNNN.bin)
+    def openRaw(self, recDir, laserNum, bufferCount):
+
+        # Line 1: Number of Interrogators, Line 2-3: First and Last DAS Channel, Line 4: Sampling Frequency,
+        # Line 5: Gauge Length, Line 6-9: ITU Channels
+        with open(os.path.join(recDir, 'recInfo.txt'), 'r') as fid:
+            recInfo = [line.strip() for line in fid if line.strip() != '']
+        numBoards = int(recInfo[0])
+        firstChann = int(recInfo[1])
+        lastChann = int(recInfo[2])
+        fs = float(recInfo[3])
+        fs = int(fs) if fs == int(fs) else fs
+        laserITU = [int(float(x)) for x in recInfo[5:]]
+        self.numChanns = lastChann - firstChann + 1
+
+        RAWdir = os.path.join(recDir, 'RAW')
+        self.rawFiles = collections.OrderedDict()
+        self.rawFileNames = sorted([os.path.join(RAWdir, fileName) for fileName in os.listdir(RAWdir) if fileName.endswith('.bin')])
+        recordsPerBuffer = round(fs/bufferCount)
+        # recInfo.txt does not hold the number of recorded lasers, so derive it from the file size
+        fileSize = os.path.getsize(self.rawFileNames[0]) if len(self.rawFileNames) > 0 else 0
+        recordSize = bufferCount * numBoards * recordsPerBuffer * self.numChanns * 2
+        if fileSize % recordSize != 0 or int(fileSize/recordSize) not in [2, 4]:
+            raise ValueError("Size of RAW files does not match recInfo.txt (check bufferCount).")
+        self.numChannels = int(fileSize/recordSize)
+        if self.numChannels == 4:
+            laserNum = 3
+
+        self.header = {'numBoards': numBoards,
+                       'firstChann': firstChann,
+                       'lastChann': lastChann,
+                       'laserNum': laserNum,
+                       'digitizerChannels': {1: ['I1', 'Q1'], 2: ['I2', 'Q2'], 3: ['I1', 'Q1', 'I2', 'Q2']}[laserNum],
+                       'layout': 'ADMA_INTERLEAVE_SAMPLES',
+                       'sampleType': 'uint16',
+                       'sampleOffset': 2**15,
+                       'sampleScale': 1/2**15,
+                       'fs': fs,
+                       'gaugeLength': int(float(recInfo[4])),
+                       'laserITU': [laserITU[2*b:2*b+2] for b in range(numBoards)],
+                       'recordsPerBuffer': recordsPerBuffer,
+                       'buffersPerSecond': bufferCount,
+                       'bytesPerBuffer': int(fileSize/(bufferCount*numBoards))}
+        self.numBuffers = len(self.rawFileNames) * bufferCount
+
+    # Close all memory maps
+    def close(self):
+
+        self.data = None
+        if self.rawFiles is not None:
+            self.rawFiles.clear()
+
+    # Function returns the zero-copy (recordsPerBuffer, numChanns*numChannels) raw data of a DMA buffer of a board
+    def getChunk(self, bufferNum, board):
+
+        if self.data is not None:
+            return(self.data[bufferNum, board])
+        # RAW recordings: each file holds 1 second of data, keep the most recently used files mapped
+        second = int(bufferNum / self.header['buffersPerSecond'])
+        if second in self.rawFiles:
+            self.rawFiles.move_to_end(second)
+        else:
+            if len(self.rawFiles) >= MAX_OPEN_FILES:
+                self.rawFiles.popitem(last=False)
+            self.rawFiles[second] = np.memmap(self.rawFileNames[second], dtype=np.uint16, mode='r',
+                                              shape=(self.header['buffersPerSecond'], self.header['numBoards'], self.header['recordsPerBuffer'], self.numChanns*self.numChannels))
+
+        return(self.rawFiles[second][bufferNum % self.header['buffersPerSecond'], board])
+
+    # Function returns the raw (time, channel, numChannels) data of a board for the given time and channel index
+    # Only the DMA buffers holding the selected samples are read
+    def readRaw(self, board, timeKey=slice(None), channKey=slice(None)):
+
+        [timeIdx, squeeze] = self.getTimeIndices(timeKey)
+        channShape = np.empty(self.numChanns, dtype=bool)[channKey].shape
+        out = np.empty(timeIdx.shape + channShape + (self.numChannels,), dtype=self.dtype)
+
+        # Split the time samples into runs lying in the same buffer
+        recordsPerBuffer = self.header['recordsPerBuffer']
+        bufferNum = timeIdx // recordsPerBuffer
+        records = timeIdx % recordsPerBuffer
+        splits = np.concatenate(([0], np.flatnonzero(np.diff(bufferNum)) + 1, [timeIdx.size])) if timeIdx.size > 0 else [0]
+        for k in range(len(splits)-1):
+            [start, stop] = [splits[k], splits[k+1]]
+            chunk = IQlayout.getChannelView(self.getChunk(bufferNum[start], board), self.numChannels)
+            runRecords = records[start:stop]
+            if runRecords[-1] - runRecords[0] == stop - start - 1:
+                chunk = chunk[runRecords[0]:runRecords[-1]+1]
+            else:
+                chunk = chunk[runRecords]
+            out[start:stop] = chunk[:, channKey]
+
+        if squeeze:
+            out = out[0]
+
+        return(out)
+
+    # Function converts a time index (int, slice or integer array) into an array of sample indices
+    def getTimeIndices(self, timeKey):
+
+        if isinstance(timeKey, slice):
+            return(np.arange(*timeKey.indices(self.numSamples)), False)
+        timeIdx = np.asarray(timeKey)
+        if timeIdx.dtype.kind not in 'iu':
+            raise TypeError("Time index needs to be an integer, slice or integer array.")
+        timeIdx = np.where(timeIdx < 0, timeIdx + self.numSamples, timeIdx)
+        if np.any(timeIdx < 0) or np.any(timeIdx >= self.numSamples):
+            raise IndexError("Time index out of range (recording holds " + str(self.numSamples) + " samples).")
+
+        return(timeIdx.reshape(-1), timeIdx.ndim == 0)
+
+    # Function returns the time slice of the samples recorded from startTime up to endTime (in seconds)
+    def getTimeSlice(self, startTime=0, endTime=None):
+
+        start = int(round(startTime * self.header['fs']))
+        stop = None if endTime is None else int(round(endTime * self.header['fs']))
+
+        return(slice(start, stop))
+
+    # Function returns the channel slice of DAS channels firstChann to lastChann (including lastChann)
+    def getChannSlice(self, firstChann, lastChann):
+
+        if firstChann < self.header['firstChann'] or lastChann > self.header['lastChann']:
+            raise IndexError("Channels " + str(firstChann) + " - " + str(lastChann) + " have not been recorded (recorded: "
+                             + str(self.header['firstChann']) + " - " + str(self.header['lastChann']) + ").")
+
+        return(slice(firstChann - self.header['firstChann'], lastChann - self.header['firstChann'] + 1))
+
+    # Function returns the lazy (time, channel) view of a laser of a board (laser: 0 = first, 1 = second laser in the record; 0 for strain recordings)
+    def getView(self, board, laser=0):
+        return(recordingView(self, board, laser))
+
+    # Function returns list holding the views of all lasers, ordered board by board (as IQlayout.getIQ)
+    def getViews(self):
+
+        views = []
+        for board in range(self.header['numBoards']):
+            for laser in range(self.numLasers):
+                views.append(self.getView(board, laser))
+
+        return(views)
+
+    # Function returns list holding (bufferNum, board) of all chunks whose content does not match the CRC32 in the index
+    def verifyChecksums(self):
+
+        if self.index is None:
+            raise ValueError("RAW recordings do not hold checksums.")
+        corrupted = []
+        for entry in self.index:
+            if zlib.crc32(self.getChunk(entry['buffer'], entry['board'])) != entry['crc32']:
+                corrupted.append((int(entry['buffer']), int(entry['board'])))
+
+        return(corrupted)
+
+
+# Lazy (time, channel) view of a laser of a board: time in samples from the start of the recording, channels relative to the first recorded DAS channel
+class recordingView:
+
+    # Reader of the recording
+    reader = None
+    # Board and laser (position in the record) of the view
+    board = 0
+    laser = 0
+    # ITU channel of the laser
+    laserITU = 0
+    # Shape (time, channel) and data type of the selected data (complex64 I + jQ, float32 strain for TIME_CHANNEL layout)
+    shape = (0, 0)
+    dtype = np.dtype(np.complex64)
+    ndim = 2
+
+    # Constructor
+    def __init__(self, reader, board, laser):
+
+        if board >= reader.header['numBoards'] or laser >= reader.numLasers:
+            raise IndexError("Board " + str(board) + " / laser " + str(laser) + " has not been recorded.")
+        self.reader = reader
+        self.board = board
+        self.laser = laser
+        if reader.numChannels == 1:
+            # Strain recordings: ITU channel used for the conversion to strain
+            self.laserITU = reader.header['strainLaserITU'][board]
+            self.dtype = np.dtype(np.float32)
+        else:
+            laserIdx = laser if reader.numChannels == 4 else reader.header['laserNum'] - 1
+            self.laserITU = reader.header['laserITU'][board][laserIdx]
+        self.shape = (reader.numSamples, reader.numChanns)
+
+    def __len__(self):
+        return(self.shape[0])
+
+    # Returns normalized I + jQ (strain for TIME_CHANNEL layout) of the selected (time, channel) data
+    def __getitem__(self, key):
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 2:
+            raise IndexError("Too many indices for (time, channel) view.")
+        key = key + (slice(None),) * (2 - len(key))
+        raw = self.reader.readRaw(self.board, key[0], key[1])
+        if self.reader.numChannels == 1:
+            data = raw[..., 0].astype(np.float32, copy=False)
+            if self.reader.header['sampleOffset'] != 0 or self.reader.header['sampleScale'] != 1:
+                data -= self.reader.header['sampleOffset']
+                data *= self.reader.header['sampleScale']
+            return(data)
+        IQ = np.empty(raw.shape[:-1], dtype=np.complex64)
+        IQ.real = raw[..., 2*self.laser]
+        IQ.imag = raw[..., 2*self.laser+1]
+        IQ -= self.reader.header['sampleOffset'] * (1 + 1j)
+        IQ *= self.reader.header['sampleScale']
+
+        return(IQ)
+
@@ -7,44 +7,268 @@ Created on Thu Dec 14 10:41:40 2017
 
 import math
 import ctypes
-import atsapi as ats
+import collections
 import numpy as np
 import os
+import queue
+import threading
 import time
 
-def getData(gui, firstChann, lastChann, recLen, laserNum):
+import dasFile
+import diskWriter
+import IQimbalance
+import simFiber
+# Use simulated digitizer boards if the simulated backend is selected
+if simFiber.isEnabled():
+    import atssim as ats
+else:
+    import atsapi as ats
 
+# Scaling of raw digitizer samples to the range -1 ... +1: (sample - SAMPLE_OFFSET) * SAMPLE_SCALE
+SAMPLE_OFFSET = 2**15
+SAMPLE_SCALE = 1/2**15
+# Data types returned by getData
+DATA_TYPES = (np.dtype(np.float64), np.dtype(np.float32), np.dtype(np.int16))
+
+# Function acquires recLen seconds of data of all boards
+# dtype selects the data type of the returned (time, numChannels*channels) matrices:
+# float64/float32: samples rescaled to the range -1 ... +1
+# int16: signed samples without rescaling (SAMPLE_SCALE is applied by later processing stages, see IQtoPhase)
+# correctIQ: apply the calibrated I/Q imbalance correction of each board to its blocks as they are copied (see getIQcorrectors)
+def getData(gui, firstChann, lastChann, recLen, laserNum, dtype=np.float64, correctIQ=False):
+
+    if np.dtype(dtype) not in DATA_TYPES:
+        raise ValueError("Unsupported data type '" + str(np.dtype(dtype)) + "' (supported: " + ', '.join([str(t) for t in DATA_TYPES]) + ").")
+
+    # Make channel range compliant with channel range supported by ATS9440 digitizer
+    [firstChann, lastChann] = getChannRange(firstChann, lastChann)
+
+    # Copy each completed block into the matrix holding the data and convert it to the requested data type
+    correctors = getIQcorrectors(gui, laserNum, SAMPLE_SCALE if np.issubdtype(dtype, np.integer) else 1) if correctIQ else None
+    data = []
+    for [i, blocks] in streamData(gui, firstChann, lastChann, recLen, laserNum):
+        for b in range(len(blocks)):
+            if i == 0:
+                data.append(np.empty((int(recLen*gui.InterrogatorHandle.fs), blocks[b].shape[1]), dtype=dtype))
+            recordsPerBuffer = blocks[b].shape[0]
+            block = data[b][i*recordsPerBuffer:(i+1)*recordsPerBuffer,:]
+            if np.issubdtype(dtype, np.integer):
+                signedData(blocks[b], block)
+            else:
+                normalizeData(blocks[b], block)
+            if correctors is not None and correctors[b] is not None:
+                correctors[b].apply(block)
+    
+    return(data, firstChann, lastChann)
+
+
+# Function rescales raw digitizer data (unsigned 16 bit) to the range -1 ... +1
+# The result is written to 'out' if given, otherwise to a new float64 matrix
+def normalizeData(rawData, out=None):
+
+    if out is None:
+        out = np.empty(rawData.shape)
+    out[:] = rawData
+    out -= SAMPLE_OFFSET
+    out *= SAMPLE_SCALE
+
+    return(out)
+
+# Function converts raw digitizer data (unsigned 16 bit, offset binary) to signed 16 bit samples without rescaling
+# The result is written to 'out' if given, otherwise to a new int16 matrix
+def signedData(rawData, out=None):
+
+    if out is None:
+        out = np.empty(rawData.shape, dtype=np.int16)
+    # Flipping the most significant bit subtracts the offset of 2**15
+    np.bitwise_xor(rawData, SAMPLE_OFFSET, out=out.view(np.uint16))
+
+    return(out)
+
+# Function returns the corrector of the calibrated I/Q imbalance (gui.Ioffset, gui.Qoffset, gui.IQgain) of each board for the recorded lasers
+# scale: scaling of the corrected samples to the range -1 ... +1
+# Returns None if the I/Q imbalance correction has not been calibrated; the corrector of a board which has not been calibrated is None
+def getIQcorrectors(gui, laserNum, scale=1):
+
+    if not gui.isCalibrated[2]:
+        return(None)
+    correctors = []
+    for b in range(len(gui.DigitizerHandle.boardHandles)):
+        if gui.Ioffset[b] is None:
+            correctors.append(None)
+        else:
+            correctors.append(IQimbalance.IQcorrector(gui.Ioffset[b], gui.Qoffset[b], gui.IQgain[b], laserNum, scale))
+
+    return(correctors)
+
+
+# Generator function streaming data from all boards in fixed-size blocks as they complete
+# Each iteration yields [blockNum, blocks], where blocks holds one (recordsPerBuffer, numChannels*postTriggerSamples) uint16 matrix per board
+# Without ring buffer, the blocks are views of the DMA buffers and are only valid until the next block is requested
+# With a ring buffer, each block is copied into a bounded ring holding the last 'ringBufferLen' blocks, which remain valid while the acquisition continues
+# If recLen is None, data is streamed until the generator is closed
+def streamData(gui, firstChann, lastChann, recLen, laserNum, bufferCount=20, ringBufferLen=0):
 
     # Make sure that boardHandles[0] is the system's master
-    if gui.DigitizerHandle.boardHandles[0].boardId != 1:
-        raise ValueError("The first board passed should be the master.")
-    for board in gui.DigitizerHandle.boardHandles:
-        if board.systemId != gui.DigitizerHandle.boardHandles[0].systemId:
-            raise ValueError("All the boards should be of the same system.")
+    checkBoards(gui)
 
-    # Trigger offset needs to be a multiple of 8
+    # Trigger offset needs to be a multiple of 8 and number of recorded channels needs to be a multiple of 32
+    [firstChann, lastChann] = getChannRange(firstChann, lastChann)
     channOffset = firstChann - 1
-    if (8 * math.floor(channOffset/8) != channOffset):
-        channOffset = 8 * math.floor(channOffset/8)
-    # Number of recorded channels needs to be a multiple of 32
     postTriggerSamples = lastChann - channOffset
-    if math.fmod(postTriggerSamples, 32) != 0:
-        postTriggerSamples = 32 * math.ceil(postTriggerSamples/32)
-    firstChann = channOffset + 1
-    lastChann = postTriggerSamples + channOffset
-    
-    # Set number of pre-trigger samples to 0
-    preTriggerSamples = 0
     
-    # Set number of buffers
-    bufferCount = 20
     # Set number of records per channel and buffer such that all buffers contain 1 second of data
     recordsPerBuffer = round(gui.InterrogatorHandle.fs/bufferCount)
     
     # Specify buffer timeout
     bufferTimeout = 5000
-    
+
     # Set number of channels used during acquisition
+    [numChannels, channelMask] = getChannelMask(laserNum)
+
+    # Configure boards and post DMA buffers
+    session = getSession(gui)
+    buffers = session.arm(channOffset, postTriggerSamples, recordsPerBuffer, channelMask, numChannels, bufferCount)
+
+    # Initialize ring buffer
+    ringBuffer = []
+    if ringBufferLen > 0:
+        for b in range(len(gui.DigitizerHandle.boardHandles)):
+            ringBuffer.append(np.empty((ringBufferLen, recordsPerBuffer, numChannels*postTriggerSamples), dtype=np.uint16))
+
+    try:
+        # Start acquisition
+        gui.DigitizerHandle.boardHandles[0].startCapture()
+
+        buffersCompleted = 0
+        while recLen is None or buffersCompleted < int(recLen*bufferCount):
+
+            # Wait for the next buffer of each board
+            blocks = []
+            for b in range(len(gui.DigitizerHandle.boardHandles)):
+                buffer = buffers[b][buffersCompleted % bufferCount]
+                gui.DigitizerHandle.boardHandles[b].waitAsyncBufferComplete(buffer.addr, bufferTimeout)
+                # Reshape data
+                # Original: [A1, B1, C1, D1, A2, B2, C2, D2, ... A512, B512, C512, D512, ... A1, B1, C1, D1, ... A512, B512, C512, D512]
+                # Reshaped: [A1, B1, C1, D1, A2, B2, C2, D2, ... A512, B512, C512, D512
+                #            A1, B1, C1, D1, A2, B2, C2, D2, ... A512, B512, C512, D512]
+                block = buffer.buffer.reshape(recordsPerBuffer, postTriggerSamples*numChannels)
+                if ringBufferLen > 0:
+                    # Copy data into ring buffer and make the DMA buffer available to be filled again by the board
+                    ringBuffer[b][buffersCompleted % ringBufferLen] = block
+                    block = ringBuffer[b][buffersCompleted % ringBufferLen]
+                    gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(buffer.addr, buffer.size_bytes)
+                blocks.append(block)
+
+            yield([buffersCompleted, blocks])
+
+            # Make the buffers available to be filled again by the board once the consumer is done with them
+            if ringBufferLen == 0:
+                for b in range(len(gui.DigitizerHandle.boardHandles)):
+                    buffer = buffers[b][buffersCompleted % bufferCount]
+                    gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(buffer.addr, buffer.size_bytes)
+
+            buffersCompleted += 1
+
+    finally:
+        # Abort the acquisition
+        session.abort()
+
+
+# Generator function streaming data from all boards in segments of segmentLen records
+# Each iteration yields [segmentNum, segment], where segment holds the uint16 data of all boards side by side (segmentLen, numBoards*numChannels*postTriggerSamples)
+# Without freeSegments, the segment is reused and only valid until the next segment is requested
+# With freeSegments (queue of segment matrices), each segment is taken from the queue; streaming stops when None is taken
+def streamSegments(gui, firstChann, lastChann, recLen, laserNum, segmentLen, bufferCount=20, freeSegments=None):
+
+    segment = None
+    segmentFill = 0
+    segmentNum = 0
+    for [blockNum, blocks] in streamData(gui, firstChann, lastChann, recLen, laserNum, bufferCount):
+        n = 0
+        while n < blocks[0].shape[0]:
+            if segmentFill == 0:
+                if freeSegments is not None:
+                    segment = freeSegments.get()
+                    if segment is None:
+                        return
+                elif segment is None:
+                    segment = np.empty((segmentLen, sum([block.shape[1] for block in blocks])), dtype=np.uint16)
+            # Copy the records of all boards into the segment
+            numRecords = min(blocks[0].shape[0] - n, segmentLen - segmentFill)
+            col = 0
+            for block in blocks:
+                segment[segmentFill:segmentFill+numRecords, col:col+block.shape[1]] = block[n:n+numRecords]
+                col += block.shape[1]
+            segmentFill += numRecords
+            n += numRecords
+            if segmentFill == segmentLen:
+                yield([segmentNum, segment])
+                segmentNum += 1
+                segmentFill = 0
+
+
+# Generator function streaming segments (see streamSegments) acquired by a background thread
+# The acquisition runs continuously while the consumer processes the segments: segment N can be processed while segment N+1 is acquired
+# The thread fills numSegments segment matrices in turn; a yielded segment is handed back to the thread when the next segment is requested
+def streamSegmentsPipelined(gui, firstChann, lastChann, recLen, laserNum, segmentLen, numSegments=2, bufferCount=20):
+
+    # Allocate segments
+    [firstChannDig, lastChannDig] = getChannRange(firstChann, lastChann)
+    [numChannels, channelMask] = getChannelMask(laserNum)
+    numBoards = len(gui.DigitizerHandle.boardHandles)
+    freeSegments = queue.Queue()
+    for k in range(numSegments):
+        freeSegments.put(np.empty((segmentLen, numBoards*numChannels*(lastChannDig-firstChannDig+1)), dtype=np.uint16))
+    completedSegments = queue.Queue()
+    stop = threading.Event()
+    error = []
+
+    # Acquisition thread
+    def acquire():
+        try:
+            for item in streamSegments(gui, firstChann, lastChann, recLen, laserNum, segmentLen, bufferCount, freeSegments):
+                if stop.is_set():
+                    break
+                completedSegments.put(item)
+        except BaseException as e:
+            error.append(e)
+        finally:
+            completedSegments.put(None)
+
+    thread = threading.Thread(target=acquire, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = completedSegments.get()
+            if item is None:
+                break
+            yield(item)
+            freeSegments.put(item[1])
+        # Hand errors of the acquisition (e.g. buffer overflow) to the consumer
+        if len(error) > 0:
+            raise error[0]
+    finally:
+        # Stop the acquisition thread
+        stop.set()
+        freeSegments.put(None)
+        thread.join()
+
+
+# Function makes sure that boardHandles[0] is the system's master and that all boards are part of the same system
+def checkBoards(gui):
+
+    if gui.DigitizerHandle.boardHandles[0].boardId != 1:
+        raise ValueError("The first board passed should be the master.")
+    for board in gui.DigitizerHandle.boardHandles:
+        if board.systemId != gui.DigitizerHandle.boardHandles[0].systemId:
+            raise ValueError("All the boards should be of the same system.")
+
+
+# Function returns number of digitizer channels and channel mask used for the selected laser(s)
+# 1 = laser 1 (Channel A & B); 2 = laser 2 (Channel C & D); 3 = laser 1 & 2 (Channel A - D)
+def getChannelMask(laserNum):
+
     if laserNum == 1:
         numChannels = 2
         channelMask = 3
@@ -54,92 +278,134 @@ def getData(gui, firstChann, lastChann, recLen, laserNum):
     elif laserNum == 3:
         numChannels = 4
         channelMask = 15
-        
-    # Calculate the size of each buffer in bytes
-    [maxSamplesPerRecord, bitsPerSample] = gui.DigitizerHandle.boardHandles[0].getChannelInfo()
-    bytesPerSample = math.floor((bitsPerSample.value + 7) / 8)
-    samplesPerBuffer = postTriggerSamples * recordsPerBuffer * numChannels
-    bytesPerBuffer = bytesPerSample * samplesPerBuffer
-    
-    
+
+    return(numChannels, channelMask)
+
+
+# Function returns the acquisition session of the digitizer boards (created on first use)
+def getSession(gui):
+
+    if gui.DigitizerHandle.acqSession is None:
+        gui.DigitizerHandle.acqSession = acqSession(gui.DigitizerHandle.boardHandles)
+
+    return(gui.DigitizerHandle.acqSession)
+
+
+# Persistent continuous AutoDMA acquisition session of all boards
+# DMA buffers (taken from ats.bufferPool) stay allocated and the record configuration stays applied across acquisitions;
+# both are only changed if the channel range, laser mask, buffer size or number of buffers changes
+class acqSession:
+
+    # Alazar board handles
+    boardHandles = []
+    # Configuration applied to the boards (channOffset, postTriggerSamples, recordsPerBuffer, channelMask, numChannels, bufferCount)
+    config = None
+    # DMA buffers of each board
     buffers = []
-    data = []
-    for b in range(len(gui.DigitizerHandle.boardHandles)):  
-        # Set time (in sample clocks) to wait after receiving a trigger event before capturing a record for the trigger    
-        gui.DigitizerHandle.boardHandles[b].setTriggerDelay(channOffset)
-        # Create array of DMA buffers
-        buffers.append([])
-        for i in range(bufferCount):
-            buffers[b].append(ats.DMABuffer(ctypes.c_uint16, bytesPerBuffer))
-        # Set the record size
-        gui.DigitizerHandle.boardHandles[b].setRecordSize(preTriggerSamples, postTriggerSamples)
-        # Configure board to make continuous AutoDMA acquisition
-        admaFlags = ats.ADMA_EXTERNAL_STARTCAPTURE | ats.ADMA_NPT | ats.ADMA_INTERLEAVE_SAMPLES
-        recordsPerAcquisition = (2**31)-1
-        gui.DigitizerHandle.boardHandles[b].beforeAsyncRead(channelMask, preTriggerSamples, postTriggerSamples, recordsPerBuffer, recordsPerAcquisition, admaFlags)
-        # Post DMA buffers to board
-        for i in buffers[b]:
-            gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(i.addr, i.size_bytes)
-        
-        # Initialize matrix holding data
-        data.append(np.zeros((int(recLen*gui.InterrogatorHandle.fs), (numChannels*postTriggerSamples)), dtype=int))
+    # Size of each DMA buffer in bytes
+    bytesPerBuffer = 0
+    # True while an acquisition is armed
+    armed = False
+    # Number of acquisitions armed and number of times the boards had to be reconfigured
+    numArmed = 0
+    numConfigured = 0
 
-    # Start acquisition
-    gui.DigitizerHandle.boardHandles[0].startCapture()
-    
-    buffersCompleted = 0
-    for i in range(int(recLen*bufferCount)):
+    # Constructor
+    def __init__(self, boardHandles):
 
-        for b in range(len(gui.DigitizerHandle.boardHandles)):
-        
-            buffer = buffers[b][buffersCompleted % bufferCount]
-            gui.DigitizerHandle.boardHandles[b].waitAsyncBufferComplete(buffer.addr, bufferTimeout)
-       
-            # Reshape data
-            # Original: [A1, B1, C1, D1, A2, B2, C2, D2, ... A512, B512, C512, D512, ... A1, B1, C1, D1, ... A512, B512, C512, D512]
-            # 1st step: [A1, B1, C1, D1, A2, B2, C2, D2, ... A512, B512, C512, D512
-            #            A1, B1, C1, D1, A2, B2, C2, D2, ... A512, B512, C512, D512]  
-            data[b][int(i*(gui.InterrogatorHandle.fs/bufferCount)):int((i+1)*(gui.InterrogatorHandle.fs/bufferCount)),:] = buffer.buffer.reshape(recordsPerBuffer, postTriggerSamples*numChannels)
-            # Make the buffer available to be filled again by the board
-            gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(buffer.addr, buffer.size_bytes)
-        
-        buffersCompleted += 1
-        
-    # Abort the acquisition
-    for b in range(len(gui.DigitizerHandle.boardHandles)):
-        gui.DigitizerHandle.boardHandles[b].abortAsyncRead()
-        data[b] = (data[b] - 2**15) / 2**15
-    
-    return(data, firstChann, lastChann)
+        self.boardHandles = boardHandles
+        self.config = None
+        self.buffers = []
+
+    # Configure all boards for a continuous AutoDMA acquisition and post the DMA buffers
+    # Returns a list holding the DMA buffers of each board
+    def arm(self, channOffset, postTriggerSamples, recordsPerBuffer, channelMask, numChannels, bufferCount):
+
+        # Abort an acquisition left armed (e.g. after an error before the acquisition was started)
+        if self.armed:
+            self.abort()
+
+        # Set number of pre-trigger samples to 0
+        preTriggerSamples = 0
+
+        config = (channOffset, postTriggerSamples, recordsPerBuffer, channelMask, numChannels, bufferCount)
+        if config != self.config:
+            # Calculate the size of each buffer in bytes
+            [maxSamplesPerRecord, bitsPerSample] = self.boardHandles[0].getChannelInfo()
+            bytesPerSample = math.floor((bitsPerSample.value + 7) / 8)
+            samplesPerBuffer = postTriggerSamples * recordsPerBuffer * numChannels
+            bytesPerBuffer = bytesPerSample * samplesPerBuffer
+
+            # Get DMA buffers from the buffer pool (existing buffers are kept if their size and number do not change)
+            if bytesPerBuffer != self.bytesPerBuffer or self.config is None or bufferCount != self.config[5]:
+                self.freeBuffers()
+                for b in range(len(self.boardHandles)):
+                    self.buffers.append([])
+                    for i in range(bufferCount):
+                        self.buffers[b].append(ats.bufferPool.get(ctypes.c_uint16, bytesPerBuffer))
+                self.bytesPerBuffer = bytesPerBuffer
+
+            for board in self.boardHandles:
+                # Set time (in sample clocks) to wait after receiving a trigger event before capturing a record for the trigger
+                board.setTriggerDelay(channOffset)
+                # Set the record size
+                board.setRecordSize(preTriggerSamples, postTriggerSamples)
+            self.config = config
+            self.numConfigured += 1
+
+        # Flagged as armed before the first board is armed, so that boards armed before a failure are aborted (here or by abort())
+        self.armed = True
+        try:
+            for b in range(len(self.boardHandles)):
+                # Configure board to make continuous AutoDMA acquisition
+                admaFlags = ats.ADMA_EXTERNAL_STARTCAPTURE | ats.ADMA_NPT | ats.ADMA_INTERLEAVE_SAMPLES
+                recordsPerAcquisition = (2**31)-1
+                self.boardHandles[b].beforeAsyncRead(channelMask, preTriggerSamples, postTriggerSamples, recordsPerBuffer, recordsPerAcquisition, admaFlags)
+                # Post DMA buffers to board
+                for buffer in self.buffers[b]:
+                    self.boardHandles[b].postAsyncBuffer(buffer.addr, buffer.size_bytes)
+        except:
+            self.abort()
+            raise
+        self.numArmed += 1
+
+        return(self.buffers)
 
+    # Abort the acquisition of all boards (DMA buffers remain allocated for the next acquisition)
+    def abort(self):
 
-def storeDataToDisk(gui, firstChann, lastChann, recLen, laserNum):
+        for board in self.boardHandles:
+            board.abortAsyncRead()
+        self.armed = False
 
+    # Hand the DMA buffers back to the buffer pool
+    def freeBuffers(self):
+
+        for boardBuffers in self.buffers:
+            for buffer in boardBuffers:
+                ats.bufferPool.release(buffer)
+        self.buffers = []
+        self.bytesPerBuffer = 0
+        self.config = None
+
+
+# Function streams data from all boards to disk
+# Filled DMA buffers are handed to a pool of writer threads and are only posted to the board again once they have been written
+# fileFormat: 'das' = single recording file with header and index (see dasFile); 'raw' = legacy RAW/dataNNNN.bin files and recInfo.txt;
+# None = no raw data is stored (e.g. strain only)
+# strain: optional strainStream (see strainStream) converting the data to strain while it is recorded
+# correctIQ: apply the calibrated I/Q imbalance correction of each board (see getIQcorrectors) to the data converted to strain
+# storeCorrectedIQ: also store corrected raw data (the DMA buffers are corrected in place before they are written and copied to the strain processing)
+def storeDataToDisk(gui, firstChann, lastChann, recLen, laserNum, bufferCount=10, numWriters=2, fileFormat='das', strain=None, correctIQ=False, storeCorrectedIQ=False):
 
-    t = time.time()
     # Make sure that boardHandles[0] is the system's master
-    if gui.DigitizerHandle.boardHandles[0].boardId != 1:
-        raise ValueError("The first board passed should be the master.")
-    for board in gui.DigitizerHandle.boardHandles:
-        if board.systemId != gui.DigitizerHandle.boardHandles[0].systemId:
-            raise ValueError("All the boards should be of the same system.")
+    checkBoards(gui)
 
-    # Trigger offset needs to be a multiple of 8
+    # Trigger offset needs to be a multiple of 8 and number of recorded channels needs to be a multiple of 32
+    [firstChann, lastChann] = getChannRange(firstChann, lastChann)
     channOffset = firstChann - 1
-    if (8 * math.floor(channOffset/8) != channOffset):
-        channOffset = 8 * math.floor(channOffset/8)
-    # Number of recorded channels needs to be a multiple of 32
     postTriggerSamples = lastChann - channOffset
-    if math.fmod(postTriggerSamples, 32) != 0:
-        postTriggerSamples = 32 * math.ceil(postTriggerSamples/32)
-    firstChann = channOffset + 1
-    lastChann = postTriggerSamples + channOffset
-    
-    # Set number of pre-trigger samples to 0
-    preTriggerSamples = 0
     
-    # Set number of buffers
-    bufferCount = 10
     # Set number of records per channel and buffer such that all buffers contain 1 second of data
     recordsPerBuffer = round(gui.InterrogatorHandle.fs/bufferCount)
     
@@ -147,92 +413,127 @@ def storeDataToDisk(gui, firstChann, lastChann, recLen, laserNum):
     bufferTimeout = 5000
     
     # Set number of channels used during acquisition
-    if laserNum == 1:
-        numChannels = 2
-        channelMask = 3
-    elif laserNum == 2:
-        numChannels = 2
-        channelMask = 12
-    elif laserNum == 3:
-        numChannels = 4
-        channelMask = 15
-        
-    # Calculate the size of each buffer in bytes
-    [maxSamplesPerRecord, bitsPerSample] = gui.DigitizerHandle.boardHandles[0].getChannelInfo()
-    bytesPerSample = math.floor((bitsPerSample.value + 7) / 8)
-    samplesPerBuffer = postTriggerSamples * recordsPerBuffer * numChannels
-    bytesPerBuffer = bytesPerSample * samplesPerBuffer
-    
-    
-    buffers = []
-    data = []
-    for b in range(len(gui.DigitizerHandle.boardHandles)):  
-        # Set time (in sample clocks) to wait after receiving a trigger event before capturing a record for the trigger    
-        gui.DigitizerHandle.boardHandles[b].setTriggerDelay(channOffset)
-        # Create array of DMA buffers
-        buffers.append([])
-        for i in range(bufferCount):
-            buffers[b].append(ats.DMABuffer(ctypes.c_uint16, bytesPerBuffer))
-        # Set the record size
-        gui.DigitizerHandle.boardHandles[b].setRecordSize(preTriggerSamples, postTriggerSamples)
-        # Configure board to make continuous AutoDMA acquisition
-        admaFlags = ats.ADMA_EXTERNAL_STARTCAPTURE | ats.ADMA_NPT | ats.ADMA_INTERLEAVE_SAMPLES
-        recordsPerAcquisition = (2**31)-1
-        gui.DigitizerHandle.boardHandles[b].beforeAsyncRead(channelMask, preTriggerSamples, postTriggerSamples, recordsPerBuffer, recordsPerAcquisition, admaFlags)
-        # Post DMA buffers to board
-        for i in buffers[b]:
-            gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(i.addr, i.size_bytes)
+    [numChannels, channelMask] = getChannelMask(laserNum)
+
+    # Configure boards and post DMA buffers
+    session = getSession(gui)
+    buffers = session.arm(channOffset, postTriggerSamples, recordsPerBuffer, channelMask, numChannels, bufferCount)
+    numBoards = len(gui.DigitizerHandle.boardHandles)
+    bytesPerBuffer = buffers[0][0].size_bytes
+    # Keep track of the order in which buffers have been posted to each board
+    postedBuffers = []
+    for b in range(numBoards):
+        postedBuffers.append(collections.deque(buffers[b]))
+
+    header = getRecordingHeader(gui, firstChann, lastChann, laserNum, recordsPerBuffer, bufferCount, bytesPerBuffer)
+    # I/Q imbalance correction of the raw samples
+    # (boards which have not been calibrated are not corrected, their parameters are None in the header)
+    correctors = getIQcorrectors(gui, laserNum, SAMPLE_SCALE) if correctIQ or storeCorrectedIQ else None
+    storeCorrectedIQ = storeCorrectedIQ and correctors is not None
+    if correctors is not None:
+        getParams = lambda params: [None if correctors[b] is None else [float(x) for x in params[b]] for b in range(numBoards)]
+        header['IQcorrection'] = {'Ioffset': getParams(gui.Ioffset),
+                                  'Qoffset': getParams(gui.Qoffset),
+                                  'IQgain': getParams(gui.IQgain),
+                                  'applied': storeCorrectedIQ}
+    recFile = None
+    if fileFormat == 'das':
+        # Create recording file holding header, data and index
+        fileName = os.path.join(gui.daqRecDir.get(), 'recording.das')
+        recFile = dasFile.dasFileWriter(fileName, header)
+    elif fileFormat == 'raw':
+        # Write record info to file
+        createRecordingInfoFile(gui, firstChann, lastChann)
         
-        # Initialize matrix holding data
-        data.append(np.zeros((int(recLen*gui.InterrogatorHandle.fs), (numChannels*postTriggerSamples)), dtype=int))
+        # If RAW directory already exists, delete its content
+        RAWdir = os.path.join(gui.daqRecDir.get(), 'RAW')
+        if os.path.isdir(RAWdir):
+            for fileName in os.listdir(RAWdir):
+                os.unlink(os.path.join(RAWdir, fileName))
+        # Otherwise, create RAW directory
+        else:
+            os.mkdir(RAWdir)
 
-    # Write record info to file
-    createRecordingInfoFile(gui, firstChann, lastChann)
-    
-    # If RAW directory already exists, delete its content
-    RAWdir = os.path.join(gui.daqRecDir.get(), 'RAW')
-    if os.path.isdir(RAWdir):
-        for fileName in os.listdir(RAWdir):
-            os.unlink(os.path.join(RAWdir, fileName))
-    # Otherwise, create RAW directory
-    else:
-        os.mkdir(RAWdir)
+    # Start strain processing and writer threads
+    if strain is not None:
+        strain.start(header, bufferCount*numBoards, correctors if correctIQ and not storeCorrectedIQ else None)
+    writer = diskWriter.diskWriter(numWriters, checksums=(recFile is not None))
 
     # Start acquisition
     print('\n\nStarting Data Acquisition')
-    gui.DigitizerHandle.boardHandles[0].startCapture()
-    buffersCompleted = 0
-    for i in range(int(recLen*bufferCount)):
+    try:
+        gui.DigitizerHandle.boardHandles[0].startCapture()
+        for i in range(int(recLen*bufferCount)):
 
-        if i % bufferCount is 0:
-            print(str(int(i/bufferCount)+1) + ' s')
-            if buffersCompleted > 0:
-                dataFid.close()
-            fileName = 'data' + '{:04d}'.format(int(i/bufferCount)+1) + '.bin'
-            dataFid = open(os.path.join(RAWdir, fileName), 'w')
+            # Each second of data holds: [Buffer 1 (Board 1), Buffer 1 (Board 2), Buffer 2 (Board 1), ...]
+            if i % bufferCount == 0:
+                print(str(int(i/bufferCount)+1) + ' s (write queue depth: ' + str(writer.queueDepth) + ', max: ' + str(writer.queueDepthMax) + ')')
+                if recFile is not None:
+                    recFile.allocateSecond(int(i/bufferCount))
+                elif fileFormat == 'raw':
+                    # Each file holds 1 second of data
+                    fileName = os.path.join(RAWdir, 'data' + '{:04d}'.format(int(i/bufferCount)+1) + '.bin')
+                    with open(fileName, 'wb') as dataFid:
+                        dataFid.truncate(bufferCount*numBoards*bytesPerBuffer)
 
-        for b in range(len(gui.DigitizerHandle.boardHandles)):
-        
-            buffer = buffers[b][buffersCompleted % bufferCount]
-            gui.DigitizerHandle.boardHandles[b].waitAsyncBufferComplete(buffer.addr, bufferTimeout)
-
-            # Save data to disk
-            buffer.buffer.tofile(dataFid)
-            
-            # Make the buffer available to be filled again by the board
-            gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(buffer.addr, buffer.size_bytes)
-        
-        buffersCompleted += 1
-        
-    # Abort the acquisition
-    for b in range(len(gui.DigitizerHandle.boardHandles)):
-        gui.DigitizerHandle.boardHandles[b].abortAsyncRead()
-    
-    dataFid.close()
-    print('Data Acquisition Complete\n')
+            for b in range(numBoards):
+
+                # If all buffers of this board are still being written, wait for the writer threads
+                while len(postedBuffers[b]) == 0:
+                    postWrittenBuffers(gui, writer.getDone(True, bufferTimeout/1000), postedBuffers)
+
+                buffer = postedBuffers[b].popleft()
+                gui.DigitizerHandle.boardHandles[b].waitAsyncBufferComplete(buffer.addr, bufferTimeout)
+
+                # Correct the I/Q imbalance of the raw samples in place
+                if storeCorrectedIQ and correctors[b] is not None:
+                    correctors[b].apply(buffer.buffer)
+
+                # Hand a copy of the buffer to the strain processing
+                if strain is not None:
+                    strain.put(i, b, buffer.buffer)
+
+                # Hand buffer to writer threads
+                if recFile is not None:
+                    offset = recFile.addChunk(i, b, time.time())
+                    writer.put(fileName, offset, buffer.buffer, [b, buffer])
+                elif fileFormat == 'raw':
+                    offset = ((i % bufferCount)*numBoards + b)*bytesPerBuffer
+                    writer.put(fileName, offset, buffer.buffer, [b, buffer])
+                else:
+                    postWrittenBuffers(gui, [[b, buffer]], postedBuffers)
+
+            # Make the buffers which have been written available to be filled again by the board
+            postWrittenBuffers(gui, writer.getDone(), postedBuffers)
+
+    finally:
+        # Abort the acquisition
+        session.abort()
+        # Wait for the writer threads to finish and write the index of all buffers written, then wait for the strain processing to finish
+        # Each output is closed even if closing the previous one raises the error of its thread (errors are re-raised in order)
+        try:
+            writer.close()
+        finally:
+            try:
+                if recFile is not None:
+                    recFile.close({offset: crc for [(name, offset), crc] in writer.checksums.items()})
+            finally:
+                if strain is not None:
+                    strain.close()
     
+    print('Data Acquisition Complete (buffers written: ' + str(writer.buffersWritten) + ', max write queue depth: ' + str(writer.queueDepthMax) + ')\n')
+    if strain is not None:
+        print('Strain Processing Complete (buffers processed: ' + str(strain.buffersProcessed) + ', max queue depth: ' + str(strain.queueDepthMax) + ')\n')
     
 
+# Function posts buffers handed back by the writer threads to their board
+def postWrittenBuffers(gui, writtenBuffers, postedBuffers):
+
+    for [b, buffer] in writtenBuffers:
+        gui.DigitizerHandle.boardHandles[b].postAsyncBuffer(buffer.addr, buffer.size_bytes)
+        postedBuffers[b].append(buffer)
+
+
 # Function returns channel range supported by ATS9440 digitizer
 def getChannRange(firstChann, lastChann):
     
@@ -249,6 +550,44 @@ def getChannRange(firstChann, lastChann):
     
     return(firstChann, lastChann)
 
+# Function returns the header of a recording file (see dasFile)
+def getRecordingHeader(gui, firstChann, lastChann, laserNum, recordsPerBuffer, buffersPerSecond, bytesPerBuffer):
+
+    numBoards = len(gui.DigitizerHandle.boardHandles)
+    # DAS interrogator connected to each board
+    if numBoards == 1:
+        interrogators = [gui.InterrogatorHandle.interrogators[gui.popupMenu_DASinterrogator.current()]]
+    else:
+        interrogators = gui.InterrogatorHandle.interrogators[0:numBoards]
+    # Digitizer channels interleaved in each record
+    digitizerChannels = {1: ['I1', 'Q1'], 2: ['I2', 'Q2'], 3: ['I1', 'Q1', 'I2', 'Q2']}[laserNum]
+    startTime = time.time()
+
+    header = {'numBoards': numBoards,
+              'firstChann': firstChann,
+              'lastChann': lastChann,
+              'laserNum': laserNum,
+              'digitizerChannels': digitizerChannels,
+              'layout': 'ADMA_INTERLEAVE_SAMPLES',
+              'sampleType': 'uint16',
+              'sampleOffset': 2**15, # Normalized sample = (sample - sampleOffset) * sampleScale
+              'sampleScale': 1/2**15,
+              'fs': gui.InterrogatorHandle.fs,
+              'gaugeLength': interrogators[0].gaugeLength,
+              'pulseWidth': gui.InterrogatorHandle.pulseWidth,
+              'interrogators': [interrogator.name for interrogator in interrogators],
+              'laserITU': [list(interrogator.laserITU) for interrogator in interrogators],
+              'interrogatorClockMode': interrogators[0].clockMode,
+              'digitizerClockMode': gui.DigitizerHandle.clockMode,
+              'triggerMode': gui.DigitizerHandle.triggerMode,
+              'recordsPerBuffer': recordsPerBuffer,
+              'buffersPerSecond': buffersPerSecond,
+              'bytesPerBuffer': bytesPerBuffer,
+              'startTime': startTime,
+              'startTimeUTC': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(startTime))}
+
+    return(header)
+
 # Function that creates the recording info file
 # Line 1: Number of Interrogators
 # Line 2: First DAS Channel
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Background writer threads for storing DMA buffers to disk
+
+The acquisition loop hands filled buffers to a pool of writer threads and
+collects the buffers that have been written, so that they can be posted to
+the board again without waiting for the disk.
+"""
+
+import queue
+import threading
+import zlib
+
+
+class diskWriter:
+
+    # Number of jobs currently queued or being written
+    queueDepth = 0
+    # Highest number of jobs queued or being written at the same time
+    queueDepthMax = 0
+    # Number of buffers written to disk
+    buffersWritten = 0
+    # Number of bytes written to disk
+    bytesWritten = 0
+    # Exception raised by a writer thread
+    error = None
+    # CRC32 of each written buffer by (fileName, offset) if checksums are enabled, otherwise None
+    checksums = None
+    # Buffer (fileName, offset) being written by each writer thread by thread name
+    writing = {}
+
+    # Constructor
+    def __init__(self, numThreads=2, checksums=False):
+
+        if checksums:
+            self.checksums = {}
+        self.writing = {}
+        self.jobQueue = queue.Queue()
+        self.doneQueue = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+        for i in range(numThreads):
+            thread = threading.Thread(target=self.writeJobs, name='diskWriter-' + str(i), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # Queue buffer to be written to file at the given byte offset
+    # 'tag' is handed back by getDone() once the buffer has been written
+    def put(self, fileName, offset, buffer, tag):
+
+        if self.error is not None:
+            raise self.error
+        with self.lock:
+            self.queueDepth += 1
+            self.queueDepthMax = max(self.queueDepthMax, self.queueDepth)
+        self.jobQueue.put((fileName, offset, buffer, tag))
+
+    # Return the tags of all buffers written since the last call
+    # If block is True, wait until at least one buffer has been written (raises TimeoutError naming the stalled buffers after timeout seconds)
+    def getDone(self, block=False, timeout=None):
+
+        tags = []
+        if block:
+            try:
+                tags.append(self.doneQueue.get(timeout=timeout))
+            except queue.Empty:
+                if self.error is not None:
+                    raise self.error
+                with self.lock:
+                    writing = [name + ': ' + fileName + ' @ ' + str(offset) for name, (fileName, offset) in sorted(self.writing.items())]
+                    queueDepth = self.queueDepth
+                raise TimeoutError("Disk writer did not finish a buffer within " + str(timeout) + " s (" + str(queueDepth) + " buffers queued or being written; "
+                                   + ('writing ' + ', '.join(writing) if writing else 'no buffer being written') + ").")
+        while True:
+            try:
+                tags.append(self.doneQueue.get_nowait())
+            except queue.Empty:
+                break
+        if self.error is not None:
+            raise self.error
+
+        return(tags)
+
+    # Wait until all queued buffers have been written and stop the writer threads
+    def close(self):
+
+        for thread in self.threads:
+            self.jobQueue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    # Writer thread
+    def writeJobs(self):
+
+        while True:
+            job = self.jobQueue.get()
+            if job is None:
+                break
+            [fileName, offset, buffer, tag] = job
+            with self.lock:
+                self.writing[threading.current_thread().name] = (fileName, offset)
+            try:
+                if self.checksums is not None:
+                    crc = zlib.crc32(buffer)
+                    with self.lock:
+                        self.checksums[(fileName, offset)] = crc
+                with open(fileName, 'r+b') as fid:
+                    fid.seek(offset)
+                    buffer.tofile(fid)
+                with self.lock:
+                    self.buffersWritten += 1
+                    self.bytesWritten += buffer.nbytes
+            except Exception as e:
+                self.error = e
+            with self.lock:
+                self.queueDepth -= 1
+                del self.writing[threading.current_thread().name]
+            self.doneQueue.put(tag)
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated DAS interrogator backend
+
+Provides a synthetic fiber backscatter model, a stand-in for opcr.dll and a
+headless replacement for the GUI object, so that dataAcq, calibration and
+diagnostics can be run and profiled without interrogator or digitizer
+hardware. The simulated digitizer boards live in Alazar/atssim.py.
+
+The backend is selected by setting the environment variable
+DASACQ_BACKEND=sim before dataAcq, digitizer and interrogator are imported.
+"""
+
+import ctypes
+import os
+import threading
+import types
+import numpy as np
+
+
+# Name of environment variable selecting the simulated backend
+BACKEND_ENV = 'DASACQ_BACKEND'
+
+# Function returns True if the simulated backend is selected
+def isEnabled():
+    return(os.environ.get(BACKEND_ENV) == 'sim')
+
+# Function selects the simulated backend (must be called before dataAcq, digitizer and interrogator are imported)
+def enable():
+    os.environ[BACKEND_ENV] = 'sim'
+
+
+##################################################################################
+# SIMULATION SETTINGS
+##################################################################################
+class simConfig:
+
+    # Number of simulated DAS interrogators (1 or 2)
+    numInterrogators = 1
+    # Laser ITU channel pair of each simulated DAS interrogator
+    laserITU = [[35, 36], [37, 38]]
+    # Channels (1 channel = 1 sample at 100 MHz) holding fiber backscatter, given as [start, end] pairs
+    sensingRegions = [[50, 5000]]
+    # Channel of the fiber stretcher generating the dither signal; channels behind it see the dither tone
+    ditherChann = 50
+    # Sensitivity of the fiber stretcher in rad per V
+    radPerV = 1.3
+    # One-way fiber attenuation in dB/km
+    attenuation = 0.2
+    # Launch EDFA current in mA below which no backscatter is detected
+    launchThreshold = 150
+    # Strength of the non-linear depletion of the launch pulse in 1/km (defines the optimal launch EDFA current)
+    nonlinearity = 0.25
+    # Backscatter amplitude (full scale = 1) at 1000 mA above launch threshold and 100 mA receive EDFA current
+    ampScale = 0.6
+    # Standard deviation of the additive I/Q noise (full scale = 1)
+    ampNoise = 0.005
+    # Standard deviation of the phase noise in rad
+    phaseNoise = 0.01
+    # I/Q imbalance of each laser: I offset, Q offset and I/Q gain (ratio of I and Q amplitude)
+    Ioffset = [0, 0]
+    Qoffset = [0, 0]
+    IQgain = [1, 1]
+    # Deliver DMA buffers at the pace of the real hardware (False delivers them as fast as they can be generated)
+    realTime = True
+    # Seed of the random number generator (fading pattern and noise)
+    seed = 0
+
+config = simConfig()
+
+
+##################################################################################
+# SYNTHETIC BACKSCATTER
+##################################################################################
+class fiberModel:
+
+    # Constructor
+    def __init__(self, cfg=config):
+
+        self.config = cfg
+        rng = np.random.default_rng(cfg.seed)
+        # Pool of normally distributed noise samples that is sliced instead of drawing new samples for every buffer
+        self.noisePool = rng.standard_normal(2**22, dtype=np.float32)
+        self.rng = rng
+        # Rayleigh fading pattern and static phase per instrument, laser and channel (extended on demand)
+        self.fading = np.zeros((0, 0))
+        self.staticPhase = np.zeros((0, 0))
+        # The fill threads of all simulated boards share the fading pattern
+        self.fadingLock = threading.Lock()
+
+    # Get noise samples of the given shape
+    def noise(self, shape):
+
+        n = int(np.prod(shape))
+        if n > self.noisePool.size:
+            return(self.rng.standard_normal(shape, dtype=np.float32))
+        start = self.rng.integers(0, self.noisePool.size - n + 1)
+        return(self.noisePool[start:start+n].reshape(shape))
+
+    # Extend fading pattern such that it covers the requested number of channels
+    def extendFading(self, numChanns):
+
+        with self.fadingLock:
+            if self.fading.shape[1] >= numChanns:
+                return
+            rng = np.random.default_rng(self.config.seed + 1)
+            numChanns = max(numChanns, 2*self.fading.shape[1])
+            # 2 instruments x 2 lasers (drawn channel by channel, so that extending the pattern keeps the existing channels)
+            fadingIQ = rng.standard_normal((numChanns, 8))
+            fadingIQ = ((fadingIQ[:, 0:4] + 1j*fadingIQ[:, 4:8])/np.sqrt(2)).T
+            self.staticPhase = np.angle(fadingIQ).astype(np.float32)
+            self.fading = np.abs(fadingIQ).astype(np.float32)
+
+    # Backscatter amplitude of each channel for the given instrument and laser
+    def amplitude(self, instrument, laser, channels):
+
+        cfg = self.config
+        self.extendFading(channels[-1] + 1)
+        inSensingRegion = np.zeros(channels.size, dtype=bool)
+        for region in cfg.sensingRegions:
+            inSensingRegion |= (channels >= region[0]) & (channels <= region[1])
+        distance = channels / 1000 # Distance in km (approx. 1 m per channel)
+        launch = max(0, instrument.launchEDFAcurrent - cfg.launchThreshold) / 1000
+        amp = cfg.ampScale * launch * np.exp(-cfg.nonlinearity * launch**2 * distance) * 10**(-2*cfg.attenuation*distance/20)
+        amp = amp * instrument.recEDFAcurrent/100 * inSensingRegion * instrument.ampOn
+        amp = amp * self.fading[2*(instrument.index % 2) + laser, channels]
+
+        return(amp.astype(np.float32))
+
+    # Generate records of the interleaved digitizer output
+    # Returns uint16 matrix of shape (numRecords, postTriggerSamples * number of digitizer channels) in ADMA_INTERLEAVE_SAMPLES layout
+    def generateRecords(self, instrument, channelMask, channOffset, postTriggerSamples, firstRecord, numRecords, out=None):
+
+        cfg = self.config
+        lasers = []
+        if channelMask & 3:
+            lasers.append(0)
+        if channelMask & 12:
+            lasers.append(1)
+        if out is None:
+            out = np.empty((numRecords, postTriggerSamples*2*len(lasers)), dtype=np.uint16)
+        out = out.reshape(numRecords, postTriggerSamples, 2*len(lasers))
+
+        channels = np.arange(channOffset, channOffset + postTriggerSamples)
+        t = ((firstRecord + np.arange(numRecords, dtype=np.float64)) / instrument.fs).reshape(-1, 1)
+        # Dither signal seen by all channels behind the fiber stretcher
+        dither = cfg.radPerV * instrument.ditherAmp * np.sin(2*np.pi*instrument.ditherFreq*t)
+        ditherCos = np.cos(dither).astype(np.float32)
+        ditherSin = np.sin(dither).astype(np.float32)
+        k = np.searchsorted(channels, cfg.ditherChann)
+
+        for n in range(len(lasers)):
+            laser = lasers[n]
+            # Static backscatter of each channel in ADC codes
+            amp = self.amplitude(instrument, laser, channels) * 2**15
+            phase = self.staticPhase[2*(instrument.index % 2) + laser, channels]
+            ampI = amp*np.cos(phase)
+            ampQ = amp*np.sin(phase)
+            # Rotate backscatter of channels behind the fiber stretcher by the dither phase
+            I = np.empty((numRecords, postTriggerSamples), dtype=np.float32)
+            Q = np.empty((numRecords, postTriggerSamples), dtype=np.float32)
+            I[:, :k] = ampI[:k]
+            Q[:, :k] = ampQ[:k]
+            np.multiply(ditherCos, ampI[k:], out=I[:, k:])
+            I[:, k:] -= ditherSin*ampQ[k:]
+            np.multiply(ditherSin, ampI[k:], out=Q[:, k:])
+            Q[:, k:] += ditherCos*ampQ[k:]
+            # Phase noise (small angle approximation)
+            phaseNoise = cfg.phaseNoise * self.noise(I.shape)
+            noiseI = Q * phaseNoise
+            Q += I * phaseNoise
+            I -= noiseI
+            # Additive noise and I/Q imbalance
+            I += cfg.ampNoise*2**15 * self.noise(I.shape)
+            I += cfg.Ioffset[laser]*2**15 + 2**15
+            Q += cfg.ampNoise*2**15 * self.noise(Q.shape)
+            Q *= 1/cfg.IQgain[laser]
+            Q += cfg.Qoffset[laser]*2**15 + 2**15
+            # Convert to unsigned 16 bit ADC codes (saturating at full scale)
+            out[:, :, 2*n] = np.clip(I, 0, 2**16-1, out=I)
+            out[:, :, 2*n+1] = np.clip(Q, 0, 2**16-1, out=Q)
+
+        return(out.reshape(numRecords, -1))
+
+
+##################################################################################
+# SIMULATED OPCR.DLL
+##################################################################################
+class opcrSim:
+
+    # Simulated DAS interrogator
+    class instrument:
+
+        # Constructor
+        def __init__(self, index, name, laserITU):
+            self.index = index
+            self.name = name
+            self.laserITU = laserITU
+            self.fs = 10000
+            self.pulseWidth = 20
+            self.launchEDFAcurrent = 250
+            self.recEDFAcurrent = 100
+            self.ampOn = 0
+            self.ditherAmp = 0
+            self.ditherFreq = 0
+            self.timing = 0
+
+    # Constructor
+    def __init__(self, cfg=config):
+
+        self.config = cfg
+        self.instruments = []
+        for i in range(cfg.numInterrogators):
+            self.instruments.append(self.instrument(i, 'CRI-4400-0' + str(101+i), cfg.laserITU[i]))
+
+    # Get simulated instrument from ctypes handle
+    def getInstrument(self, handle):
+        return(self.instruments[getValue(handle) - 1])
+
+    def List_Unopened_Instruments(self, uniqueID, listLen):
+        uniqueID.value = str.encode(','.join([instr.name for instr in self.instruments]))
+        getObj(listLen).value = len(self.instruments)
+        return(0)
+
+    def Open_Communication(self, handle, uniqueID):
+        name = getObj(uniqueID).value.decode('UTF-8')
+        for instr in self.instruments:
+            if instr.name == name:
+                getObj(handle).value = instr.index + 1
+                return(0)
+        return(1)
+
+    def Get_Laser_ITU(self, handle, laserNum, laserITU):
+        getObj(laserITU).value = self.getInstrument(handle).laserITU[getValue(laserNum)-1]
+        return(0)
+
+    def Set_Timing_CRI4200(self, handle, pulsePeriod, pulseWidth, sampleDelay, shutterWidth, shutterDelay):
+        instr = self.getInstrument(handle)
+        instr.fs = 10**8/getValue(pulsePeriod)
+        instr.pulseWidth = 10*getValue(pulseWidth)
+        return(0)
+
+    def Set_Optical_Output_Amp_Current(self, handle, current):
+        self.getInstrument(handle).launchEDFAcurrent = getValue(current)
+        return(0)
+
+    def Set_Optical_Rcvr_Amp_Current(self, handle, current):
+        self.getInstrument(handle).recEDFAcurrent = getValue(current)
+        return(0)
+
+    def Optical_Output_Amp_On(self, handle):
+        self.getInstrument(handle).ampOn = 1
+        return(0)
+
+    def Optical_Output_Amp_Off(self, handle):
+        self.getInstrument(handle).ampOn = 0
+        return(0)
+
+    def Enable_Optical_Rcvr_Dither(self, handle, amp, period):
+        instr = self.getInstrument(handle)
+        instr.ditherAmp = getValue(amp)
+        instr.ditherFreq = 100000/getValue(period)
+        return(0)
+
+    def Disable_Optical_Rcvr_Dither(self, handle):
+        self.getInstrument(handle).ditherAmp = 0
+        return(0)
+
+    def Start_Timing(self, handle):
+        self.getInstrument(handle).timing = 1
+        return(0)
+
+    def Stop_Timing(self, handle):
+        self.getInstrument(handle).timing = 0
+        return(0)
+
+    # All other calls (clock, gauge length, trigger and shutter settings) are accepted without effect
+    def __getattr__(self, name):
+        return(lambda *args: 0)
+
+
+# Function returns the value of a ctypes object, a ctypes reference or a Python number
+def getValue(arg):
+    return(getObj(arg).value if hasattr(getObj(arg), 'value') else arg)
+
+# Function returns the object referenced by a ctypes reference
+def getObj(arg):
+    return(arg._obj if hasattr(arg, '_obj') else arg)
+
+
+# Simulated DAS interrogators and backscatter shared by atssim and interrogator
+opcr = opcrSim()
+fiber = fiberModel()
+
+# Function re-creates the simulated DAS interrogators and backscatter after the simulation settings have been changed
+def reset():
+    global opcr, fiber
+    opcr = opcrSim()
+    fiber = fiberModel()
+
+
+##################################################################################
+# HEADLESS GUI
+##################################################################################
+class headlessGui:
+
+    # Stand-in for tkinter widgets and variables used by calibration, diagnostics and dataAcq
+    class widget:
+
+        def __init__(self, value=0):
+            self.value = value
+
+        def get(self):
+            return(self.value)
+
+        def set(self, value):
+            self.value = value
+
+        def current(self, value=None):
+            if value is None:
+                return(self.value)
+            self.value = value
+
+        def __setitem__(self, key, value):
+            pass
+
+        # All other widget calls (insert, see, step, update, savefig, ...) are ignored
+        def __getattr__(self, name):
+            return(lambda *args, **kwargs: None)
+
+    # Calibration settings (see GUI.GUI)
+    isCalibrated = [0, 0, 0]
+    fiberEndChann = 0
+    fiberSensingRegions = []
+    boardSensingRegions = []
+    Ioffset = [None, None]
+    Qoffset = [None, None]
+    IQgain = [None, None]
+    thresh_EDFAinit = 0.005
+    thresh_sensingRegionGap = 200
+    thresh_saturatedChannRatio = 0.02
+
+    # Constructor
+    def __init__(self, recDir=''):
+
+        enable()
+        import digitizer
+        import interrogator
+
+        self.InterrogatorHandle = interrogator.interrogatorAssembly()
+        self.DigitizerHandle = digitizer.digitizer(1, len(self.InterrogatorHandle.interrogators))
+        self.textWindow = self.widget()
+        self.progressBar = self.widget()
+        self.calibResultsPdf = self.widget()
+        self.popupMenu_clockMode = self.widget(0)
+        self.popupMenu_DASinterrogator = self.widget(0)
+        self.popupMenu_fsDAS = self.widget(6)
+        self.selectedLaunchEDFA = self.widget()
+        self.selectedRecEDFA = self.widget()
+        self.selectedDiagnosticsFormat = self.widget(1)
+        self.daqRecDir = self.widget(recDir)
+        self.diagnostics = types.SimpleNamespace(resultsPdf=self.widget(),
+                                                 acousticNoiseFloor=types.SimpleNamespace(channRange=[[4000, 4500]], testDur=10, freqRange=[4000, 5000], medAcousticNoiseFloor=[], numWorkers=1))
+
+    def update(self):
+        pass
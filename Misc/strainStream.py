@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Live strain output of a running recording
+
+A strainStream is handed to dataAcq.storeDataToDisk. Every DMA buffer is
+copied into the stream and converted by a background thread: optional I/Q
+imbalance correction (IQimbalance.IQcorrector of the board, in place on the
+signed 16 bit samples), weighted phase of the recorded lasers
+(IQtoPhase.weightedPhaseUnwrapper, continuous across buffers), conversion to
+pico strain (IQtoPhase.phaseToStrain) and optional polyphase decimation
+(transforms.polyphaseDecimator; the filter is causal, so the strain is delayed
+by header['delay'] seconds relative to the raw data). The float32 (time,
+channel) strain of each buffer and board is written to a recording file
+(strain.das, see dasFile) and/or sent to a socket.
+
+Socket protocol: for each buffer and board, a chunk header (little endian
+uint64 buffer number, uint32 board, uint32 number of samples, uint32 number
+of channels) followed by the float32 strain in (time, channel) order.
+"""
+
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+
+import dasFile
+import IQlayout
+import IQtoPhase
+import transforms
+
+
+# Refractive Index of SMF-28e
+REFRACTIVE_INDEX = 1.4682
+# Chunk header sent to the socket: buffer number, board, number of samples, number of channels
+CHUNK_HEADER_FORMAT = '<QIII'
+
+
+class strainStream:
+
+    # Decimation factor of the strain data
+    decimation = 1
+    # Name of the strain recording file ('' = no file)
+    fileName = ''
+    # Socket address: (host, port) for TCP or path of a Unix domain socket (None = no socket)
+    address = None
+    # Header of the strain recording (see start())
+    header = {}
+    # Number of buffers processed
+    buffersProcessed = 0
+    # Number of buffers queued or being processed and its maximum
+    queueDepth = 0
+    queueDepthMax = 0
+    # I/Q imbalance correction of the signed samples of each board (None = no correction, see start())
+    correctors = None
+    # Exception raised by the processing thread
+    error = None
+    # CRC32 of each chunk written to the strain recording file by offset
+    checksums = {}
+
+    # Constructor
+    # fileName: strain recording file, address: socket address, decimation: decimation factor of the strain data
+    def __init__(self, fileName='', address=None, decimation=1, refractiveInd=REFRACTIVE_INDEX):
+
+        self.fileName = fileName
+        self.address = address
+        self.decimation = decimation
+        self.refractiveInd = refractiveInd
+        self.thread = None
+
+    # Start the processing thread for a recording described by 'header' (see dataAcq.getRecordingHeader)
+    # numSlots: number of buffers that can be queued for processing
+    # correctors: optional IQimbalance.IQcorrector of each board (None = board not corrected) applied to its data before the conversion to strain
+    def start(self, header, numSlots, correctors=None):
+
+        if header['recordsPerBuffer'] % self.decimation != 0:
+            raise ValueError("Records per buffer (" + str(header['recordsPerBuffer']) + ") need to be a multiple of the decimation factor.")
+        self.numBoards = header['numBoards']
+        self.numChannels = len(header['digitizerChannels'])
+        self.numChanns = header['lastChann'] - header['firstChann'] + 1
+        # ITU channel used for the conversion to strain (first recorded laser)
+        laserIdx = 1 if header['laserNum'] == 2 else 0
+        self.laserITU = [ITU[laserIdx] for ITU in header['laserITU']]
+        self.gaugeLength = header['gaugeLength']
+        self.correctors = correctors
+
+        # State of each board: weighted phase unwrapping and polyphase decimation
+        self.unwrappers = [IQtoPhase.weightedPhaseUnwrapper(int(self.numChannels/2), header['sampleScale']) for b in range(self.numBoards)]
+        self.decimators = [transforms.polyphaseDecimator(self.decimation) for b in range(self.numBoards)]
+
+        # Strain recording header
+        recordsPerBuffer = int(header['recordsPerBuffer']/self.decimation)
+        self.header = dict(header)
+        self.header.update({'dataType': 'strain',
+                            'units': 'pstrain',
+                            'digitizerChannels': [],
+                            'layout': 'TIME_CHANNEL',
+                            'sampleType': 'float32',
+                            'sampleOffset': 0,
+                            'sampleScale': 1,
+                            'fs': header['fs']/self.decimation,
+                            'decimation': self.decimation,
+                            'delay': self.decimators[0].delay/header['fs'], # Strain sample k corresponds to raw data at k/fs - delay seconds
+                            'refractiveIndex': self.refractiveInd,
+                            'strainLaserITU': self.laserITU,
+                            'recordsPerBuffer': recordsPerBuffer,
+                            'bytesPerBuffer': recordsPerBuffer*self.numChanns*4})
+        self.strainFile = None
+        self.checksums = {}
+        if self.fileName != '':
+            self.strainFile = dasFile.dasFileWriter(self.fileName, self.header)
+            self.fid = open(self.fileName, 'r+b')
+        self.sock = None
+        if self.address is not None:
+            if isinstance(self.address, str):
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(self.address)
+            else:
+                self.sock = socket.create_connection(self.address)
+
+        # Slots holding copies of the raw buffers
+        self.freeSlots = queue.Queue()
+        for k in range(numSlots):
+            self.freeSlots.put(np.empty((header['recordsPerBuffer'], self.numChanns*self.numChannels), dtype=np.uint16))
+        self.jobQueue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.processJobs, name='strainStream', daemon=True)
+        self.thread.start()
+
+    # Queue a copy of the raw data of buffer bufferNum of a board for processing
+    # Blocks if all slots are in use (processing is slower than the acquisition)
+    def put(self, bufferNum, board, rawBuffer):
+
+        if self.error is not None:
+            raise self.error
+        slot = self.freeSlots.get()
+        slot[:] = rawBuffer.reshape(slot.shape)
+        with self.lock:
+            self.queueDepth += 1
+            self.queueDepthMax = max(self.queueDepthMax, self.queueDepth)
+        self.jobQueue.put((bufferNum, board, slot, time.time()))
+
+    # Wait until all queued buffers have been processed, stop the processing thread and close the outputs
+    def close(self):
+
+        if self.thread is not None:
+            self.jobQueue.put(None)
+            self.thread.join()
+            self.thread = None
+            if self.strainFile is not None:
+                self.fid.close()
+                self.strainFile.close(self.checksums)
+            if self.sock is not None:
+                self.sock.close()
+        if self.error is not None:
+            raise self.error
+
+    # Function returns the (time, channel) strain of the raw data of a board
+    def getStrain(self, board, rawData):
+
+        # Signed samples (flipping the most significant bit subtracts the offset of 2**15), scaling is applied by the unwrapper
+        signedData = np.bitwise_xor(rawData, 2**15).view(np.int16)
+        if self.correctors is not None and self.correctors[board] is not None:
+            self.correctors[board].apply(signedData)
+        [I, Q] = IQlayout.getIQ(signedData, self.numChannels)
+        phaseData = self.unwrappers[board].update(I, Q)
+        strainData = IQtoPhase.phaseToStrain(phaseData, self.refractiveInd, self.laserITU[board], self.gaugeLength).astype(np.float32, copy=False)
+        strainData = self.decimators[board].update(strainData)
+
+        return(np.ascontiguousarray(strainData))
+
+    # Processing thread
+    def processJobs(self):
+
+        while True:
+            job = self.jobQueue.get()
+            if job is None:
+                break
+            [bufferNum, board, slot, timestamp] = job
+            try:
+                if self.error is None:
+                    strainData = self.getStrain(board, slot)
+                    if self.strainFile is not None:
+                        if board == 0 and bufferNum % self.header['buffersPerSecond'] == 0:
+                            self.strainFile.allocateSecond(int(bufferNum/self.header['buffersPerSecond']))
+                        offset = self.strainFile.addChunk(bufferNum, board, timestamp)
+                        self.checksums[offset] = zlib.crc32(strainData)
+                        self.fid.seek(offset)
+                        strainData.tofile(self.fid)
+                    if self.sock is not None:
+                        self.sock.sendall(struct.pack(CHUNK_HEADER_FORMAT, bufferNum, board, strainData.shape[0], strainData.shape[1]))
+                        self.sock.sendall(strainData)
+                    self.buffersProcessed += 1
+            except Exception as e:
+                self.error = e
+            with self.lock:
+                self.queueDepth -= 1
+            self.freeSlots.put(slot)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:21:05 2026
+
+@author: H131339
+"""
+
+import numpy as np
+import pytest
+
+import dasReader
+import dataAcq
+import IQimbalance
+import IQlayout
+import simFiber
+
+
+# I offset, Q offset and I/Q gain of laser 1 and 2 of the simulated interrogator
+IOFFSET = [0.02, -0.01]
+QOFFSET = [-0.015, 0.01]
+IQGAIN = [1.1, 0.95]
+
+
+# Function sets the I/Q imbalance of the simulation settings
+def setImbalance(config):
+
+    config.Ioffset = IOFFSET
+    config.Qoffset = QOFFSET
+    config.IQgain = IQGAIN
+
+# Function returns normalized I and Q data of laser 1 and 2 (lists of (time, channel) matrices) and the backscatter amplitude of each channel
+def getImbalancedIQ(simRecords, numRecords=20000, numChanns=64, channOffset=100):
+
+    setImbalance(simRecords.config)
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(simRecords(numRecords, numChanns, channOffset)))
+    channels = np.arange(channOffset, channOffset + numChanns)
+
+    return(I, Q, [simRecords.amplitude(laser, channels) for laser in range(2)])
+
+# Both methods estimate the I/Q imbalance of channels with a strong backscatter
+@pytest.mark.parametrize('method', IQimbalance.METHODS)
+def test_estimate(simRecords, method):
+
+    [I, Q, amplitude] = getImbalancedIQ(simRecords)
+    for laser in range(2):
+        strong = amplitude[laser] > 0.2
+        [Ioffset, Qoffset, IQgain] = IQimbalance.getIQImbalance(I[laser], Q[laser], method, 2)
+        assert np.count_nonzero(strong) > 10
+        np.testing.assert_allclose(Ioffset[strong], IOFFSET[laser], rtol=0, atol=0.01)
+        np.testing.assert_allclose(Qoffset[strong], QOFFSET[laser], rtol=0, atol=0.01)
+        np.testing.assert_allclose(IQgain[strong], IQGAIN[laser], rtol=0.03)
+
+# Blocks added as they are acquired give the estimate of all samples at once (all channels and lasers of a (time, channel, laser) view at once)
+@pytest.mark.parametrize('method', IQimbalance.METHODS)
+def test_estimateBlocks(simRecords, method):
+
+    [I, Q, amplitude] = getImbalancedIQ(simRecords, 5000)
+    [I, Q] = [np.stack(I, axis=-1), np.stack(Q, axis=-1)]
+    estimator = IQimbalance.IQimbalanceEstimator(method, robust=False)
+    for k in range(0, 5000, 1024):
+        estimator.update(I[k:k+1024], Q[k:k+1024])
+    reference = IQimbalance.getIQImbalance(I, Q, method, robust=False)
+
+    for k in range(3):
+        assert estimator.getEstimate()[k].shape == (64, 2)
+        np.testing.assert_allclose(estimator.getEstimate()[k], reference[k], rtol=1e-9, atol=1e-12)
+
+# Unknown methods and estimates without data are rejected
+def test_invalidUse():
+
+    with pytest.raises(ValueError):
+        IQimbalance.IQimbalanceEstimator('fft')
+    with pytest.raises(ValueError):
+        IQimbalance.IQimbalanceEstimator('ellipse').getEstimate()
+
+# Raw (uint16), signed (int16) and float samples are corrected alike (16 bit samples rounded to the nearest sample and saturated)
+def test_correctorDataTypes(simRecords):
+
+    setImbalance(simRecords.config)
+    rawData = simRecords(1000, 64, 100)
+    corrector = IQimbalance.IQcorrector(IOFFSET, QOFFSET, IQGAIN, 3, dataAcq.SAMPLE_SCALE)
+    reference = IQimbalance.IQcorrector(IOFFSET, QOFFSET, IQGAIN).apply(dataAcq.normalizeData(rawData))
+    signedData = corrector.apply(dataAcq.signedData(rawData))
+    corrector.apply(rawData)
+
+    np.testing.assert_allclose(dataAcq.normalizeData(rawData), np.clip(reference, -1, 1 - dataAcq.SAMPLE_SCALE), rtol=0, atol=0.5*dataAcq.SAMPLE_SCALE + 1e-12)
+    np.testing.assert_array_equal(dataAcq.signedData(rawData), signedData)
+
+# Corrected data of the calibrated lasers does not hold an I/Q imbalance anymore
+@pytest.mark.parametrize('laserNum', [1, 2, 3])
+def test_correctorLasers(simRecords, laserNum):
+
+    [I, Q, amplitude] = getImbalancedIQ(simRecords, 10000)
+    lasers = {1: [0], 2: [1], 3: [0, 1]}[laserNum]
+    data = np.stack(sum([[I[l], Q[l]] for l in lasers], []), axis=-1).reshape(10000, -1)
+    IQimbalance.IQcorrector(IOFFSET, QOFFSET, IQGAIN, laserNum).apply(data)
+    [I, Q] = IQlayout.getIQ(data, 2*len(lasers))
+
+    for k in range(len(lasers)):
+        strong = amplitude[lasers[k]] > 0.2
+        [Ioffset, Qoffset, IQgain] = IQimbalance.getIQImbalance(I[k], Q[k], 'ellipse', 2)
+        np.testing.assert_allclose(Ioffset[strong], 0, rtol=0, atol=0.005)
+        np.testing.assert_allclose(Qoffset[strong], 0, rtol=0, atol=0.005)
+        np.testing.assert_allclose(IQgain[strong], 1, rtol=0.01)
+
+# Recordings of the calibrated simulated interrogator store corrected raw data on request
+def test_storeCorrectedIQ(simGui, tmp_path, monkeypatch):
+
+    for [name, value] in [['Ioffset', IOFFSET], ['Qoffset', QOFFSET], ['IQgain', IQGAIN]]:
+        monkeypatch.setattr(simFiber.config, name, value)
+    simGui.InterrogatorHandle.interrogators[0].setLaunchEDFA(800)
+    simGui.InterrogatorHandle.interrogators[0].enableDither(3, 170)
+    assert dataAcq.getIQcorrectors(simGui, 3) is None
+    [simGui.Ioffset, simGui.Qoffset, simGui.IQgain, simGui.isCalibrated] = [[IOFFSET], [QOFFSET], [IQGAIN], [1, 1, 1]]
+    dataAcq.storeDataToDisk(simGui, 1000, 1100, 1, 3, storeCorrectedIQ=True)
+    reader = dasReader.dasReader(str(tmp_path))
+
+    assert reader.header['IQcorrection']['applied'] and reader.header['IQcorrection']['IQgain'] == [IQGAIN]
+    for laser in range(2):
+        IQ = reader.getView(0, laser)[:, :]
+        [Ioffset, Qoffset, IQgain] = IQimbalance.getIQImbalance(IQ.real.astype(np.float64), IQ.imag.astype(np.float64), 'ellipse', 2)
+        strong = simFiber.fiber.amplitude(simFiber.opcr.instruments[0], laser, np.arange(reader.header['firstChann'] - 1, reader.header['lastChann'])) > 0.2
+        assert np.count_nonzero(strong) > 10
+        np.testing.assert_allclose(Ioffset[strong], 0, rtol=0, atol=0.005)
+        np.testing.assert_allclose(IQgain[strong], 1, rtol=0.01)
+    reader.close()
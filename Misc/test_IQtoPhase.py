@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:20:11 2026
+
+@author: H131339
+"""
+
+import numpy as np
+
+import dataAcq
+import IQlayout
+import IQtoPhase
+
+
+# Weighted phase of all channels in one pass matches the phase computed channel by channel
+def test_weightedPhaseAllChannels(simRecords):
+
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(simRecords(2000, 80, 20)))
+    # Process more channels than CHUNK_CHANNS, so that the last chunk is a partial one
+    weightedPhaseData = IQtoPhase.getWeightedPhaseDataAll(I, Q)
+
+    assert weightedPhaseData.shape == (2000, 80)
+    for channel in range(80):
+        np.testing.assert_allclose(weightedPhaseData[:, channel], IQtoPhase.getWeightedPhaseData(I, Q, channel), rtol=0, atol=1e-9)
+
+# Raw samples (int16 with scale) give the weighted phase of the rescaled float64 samples
+def test_weightedPhaseIntegerSamples(simRecords):
+
+    [I, Q] = IQlayout.getIQ(dataAcq.signedData(simRecords(2000, 40, 20)))
+    weightedPhaseData = IQtoPhase.getWeightedPhaseDataAll(I, Q, 1/2**15)
+    reference = IQtoPhase.getWeightedPhaseDataAll([x/2**15 for x in I], [x/2**15 for x in Q])
+
+    assert weightedPhaseData.dtype == np.float64
+    np.testing.assert_allclose(weightedPhaseData, reference, rtol=0, atol=1e-3)
+
+# Phase unwrapped block by block matches the phase of all samples unwrapped at once
+def test_phaseUnwrapperBlocks(simRecords):
+
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(simRecords(3000, 40, 20)))
+    [I, Q] = [I[0], Q[0]]
+    unwrapper = IQtoPhase.phaseUnwrapper()
+    phaseData = np.concatenate([unwrapper.update(I[k:k+257], Q[k:k+257]) for k in range(0, 3000, 257)])
+
+    np.testing.assert_allclose(phaseData, IQtoPhase.getPhaseData(I, Q), rtol=0, atol=1e-9)
+
+# Weighted phase streamed in blocks matches the weighted phase of all samples at once
+def test_weightedPhaseUnwrapperBlocks(simRecords):
+
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(simRecords(3000, 40, 20)))
+    unwrapper = IQtoPhase.weightedPhaseUnwrapper(len(I))
+    blocks = [unwrapper.update([x[k:k+257] for x in I], [x[k:k+257] for x in Q]) for k in range(0, 3000, 257)]
+
+    np.testing.assert_allclose(np.concatenate(blocks), IQtoPhase.getWeightedPhaseDataAll(I, Q), rtol=0, atol=1e-9)
+
+# After reset the unwrapper starts over with the phase of the next block
+def test_phaseUnwrapperReset(simRecords):
+
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(simRecords(1000, 10, 20)))
+    [I, Q] = [I[0], Q[0]]
+    unwrapper = IQtoPhase.phaseUnwrapper()
+    unwrapper.update(I[:500], Q[:500])
+    unwrapper.reset()
+
+    np.testing.assert_allclose(unwrapper.update(I[500:], Q[500:]), IQtoPhase.getPhaseData(I[500:], Q[500:]), rtol=0, atol=1e-9)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:58:34 2026
+
+@author: H131339
+"""
+
+import json
+import os
+
+import calibCache
+import calibration
+import simFiber
+
+
+# Function returns calibration results of the simulated fiber (sensing region as simFiber.config) serializable to JSON
+def getResults(gui):
+
+    results = calibration.getCalibrationResults(gui)
+    results['launchEDFAcurrent'] = [800 for interrogator in gui.InterrogatorHandle.interrogators]
+    results['fiberSensingRegions'] = simFiber.config.sensingRegions
+    results['boardSensingRegions'] = [simFiber.config.sensingRegions for interrogator in gui.InterrogatorHandle.interrogators]
+    results['fiberEndChann'] = simFiber.config.sensingRegions[-1][1]
+    results['isCalibrated'] = [1, 1, 0]
+
+    return(json.loads(json.dumps(results)))
+
+# Results are found for the configuration they have been stored for and not after the configuration has changed
+def test_cacheHitAndMiss(simGui, tmp_path):
+
+    fileName = os.path.join(str(tmp_path), 'calibrationCache.json')
+    key = calibCache.getKey(simGui)
+    assert calibCache.lookup(fileName, key) is None
+
+    calibCache.store(fileName, key, getResults(simGui))
+    cachedResults = calibCache.lookup(fileName, key)
+    assert cachedResults['launchEDFAcurrent'] == [800] and 'time' in cachedResults
+    # Gauge length and pulse width are part of the key, the DAS sampling frequency is a result
+    simGui.InterrogatorHandle.fs = 5000
+    assert calibCache.lookup(fileName, calibCache.getKey(simGui)) is not None
+    simGui.InterrogatorHandle.interrogators[0].gaugeLength += 5
+    assert calibCache.lookup(fileName, calibCache.getKey(simGui)) is None
+    simGui.InterrogatorHandle.interrogators[0].gaugeLength -= 5
+    simGui.InterrogatorHandle.pulseWidth += 10
+    assert calibCache.lookup(fileName, calibCache.getKey(simGui)) is None
+    simGui.InterrogatorHandle.pulseWidth -= 10
+    assert calibCache.lookup(fileName, calibCache.getKey(simGui)) is not None
+
+    calibCache.remove(fileName, key)
+    assert calibCache.lookup(fileName, key) is None
+
+# Cache files of another version are ignored
+def test_cacheVersion(simGui, tmp_path):
+
+    fileName = os.path.join(str(tmp_path), 'calibrationCache.json')
+    key = calibCache.getKey(simGui)
+    calibCache.store(fileName, key, getResults(simGui))
+    with open(fileName, 'r') as fid:
+        cache = json.load(fid)
+    cache['version'] = calibCache.CACHE_VERSION - 1
+    with open(fileName, 'w') as fid:
+        json.dump(cache, fid)
+
+    assert calibCache.lookup(fileName, key) is None
+
+# Cached results are accepted by a short capture of the same fiber and rejected after the fiber end has moved
+def test_verifyCachedCalibration(simGui, tmp_path, monkeypatch):
+
+    fileName = os.path.join(str(tmp_path), 'calibrationCache.json')
+    calibCache.store(fileName, calibCache.getKey(simGui), getResults(simGui))
+    calibration.applyCalibrationResults(simGui, calibCache.lookup(fileName, calibCache.getKey(simGui)))
+    assert simGui.InterrogatorHandle.interrogators[0].launchEDFAcurrent == 800
+    assert calibration.verifyCalibration(simGui)
+
+    monkeypatch.setattr(simFiber.config, 'sensingRegions', [[50, 3000]])
+    assert not calibration.verifyCalibration(simGui)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:05:52 2026
+
+@author: H131339
+"""
+
+import os
+import zlib
+import numpy as np
+
+import dasFile
+import dasReader
+import dataAcq
+import IQlayout
+
+
+# Function writes the chunks (one board) of a recording as storeDataToDisk and returns the file name
+def writeRecording(tmp_path, chunks, header):
+
+    fileName = os.path.join(str(tmp_path), 'recording.das')
+    recFile = dasFile.dasFileWriter(fileName, header)
+    checksums = {}
+    for i in range(len(chunks)):
+        if i % header['buffersPerSecond'] == 0:
+            recFile.allocateSecond(int(i/header['buffersPerSecond']))
+        offset = recFile.addChunk(i, 0, 1000.0 + i)
+        with open(fileName, 'r+b') as fid:
+            fid.seek(offset)
+            fid.write(chunks[i].tobytes())
+        checksums[offset] = zlib.crc32(chunks[i])
+    recFile.close(checksums)
+
+    return(fileName)
+
+# Function returns the header of a single board recording of the given chunks (ADMA_INTERLEAVE_SAMPLES layout, laser 1 & 2)
+def getHeader(chunks):
+
+    return({'numBoards': 1, 'firstChann': 101, 'lastChann': 100 + int(chunks[0].shape[1]/4), 'laserNum': 3, 'digitizerChannels': ['I1', 'Q1', 'I2', 'Q2'],
+            'layout': 'ADMA_INTERLEAVE_SAMPLES', 'sampleType': 'uint16', 'sampleOffset': 2**15, 'sampleScale': 1/2**15, 'fs': 100,
+            'gaugeLength': 10, 'laserITU': [[35, 36]], 'recordsPerBuffer': chunks[0].shape[0], 'buffersPerSecond': 2, 'bytesPerBuffer': chunks[0].nbytes})
+
+# Chunks written to a recording file are read back with header, index and matching checksums
+def test_roundTrip(simRecords, tmp_path):
+
+    chunks = [simRecords(50, 64) for i in range(5)]
+    fileName = writeRecording(tmp_path, chunks, getHeader(chunks))
+    [header, preamble] = dasFile.readHeader(fileName)
+    index = dasFile.readIndex(fileName)
+    reader = dasReader.dasReader(str(tmp_path))
+
+    assert header['formatVersion'] == dasFile.VERSION and header['lastChann'] == 164
+    assert preamble['dataOffset'] % dasFile.DATA_ALIGNMENT == 0
+    assert list(index['buffer']) == list(range(5)) and list(index['timestamp']) == [1000.0 + i for i in range(5)]
+    assert reader.numBuffers == 5 and reader.numSamples == 250
+    assert reader.verifyChecksums() == []
+    for i in range(5):
+        np.testing.assert_array_equal(reader.getChunk(i, 0), chunks[i])
+    # Views return normalized I + jQ of each laser
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(np.concatenate(chunks)))
+    views = reader.getViews()
+    for laser in range(2):
+        np.testing.assert_allclose(views[laser][:, :], I[laser] + 1j*Q[laser], rtol=0, atol=1e-6)
+    np.testing.assert_allclose(views[1][reader.getTimeSlice(0.5, 1.5), reader.getChannSlice(120, 130)], (I[1] + 1j*Q[1])[50:150, 19:30], rtol=0, atol=1e-6)
+    reader.close()
+
+# A chunk whose content has changed after it has been written fails the CRC check
+def test_corruptedChunk(simRecords, tmp_path):
+
+    chunks = [simRecords(50, 64) for i in range(4)]
+    fileName = writeRecording(tmp_path, chunks, getHeader(chunks))
+    [header, preamble] = dasFile.readHeader(fileName)
+    offset = dasFile.getChunkOffset(header, preamble['dataOffset'], 2, 0)
+    with open(fileName, 'r+b') as fid:
+        fid.seek(offset + 1000)
+        value = fid.read(1)[0]
+        fid.seek(offset + 1000)
+        fid.write(bytes([value ^ 0xFF]))
+
+    assert dasReader.dasReader(fileName).verifyChecksums() == [(2, 0)]
+
+# Recording of a simulated interrogator stored by storeDataToDisk holds all buffers with matching checksums
+def test_storeDataToDisk(simGui, tmp_path):
+
+    dataAcq.storeDataToDisk(simGui, 100, 400, 1, 3, bufferCount=10)
+    reader = dasReader.dasReader(str(tmp_path))
+
+    assert reader.header['firstChann'] <= 100 and reader.header['lastChann'] >= 400
+    assert reader.numBuffers == 10 and reader.numSamples == simGui.InterrogatorHandle.fs
+    assert reader.verifyChecksums() == []
+    assert reader.getView(0, 1)[:, :].shape == (reader.numSamples, reader.numChanns)
+    reader.close()
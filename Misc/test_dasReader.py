@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:31:08 2026
+
+@author: H131339
+"""
+
+import os
+import numpy as np
+import pytest
+
+import dasFile
+import dasReader
+import dataAcq
+
+
+# RAW recordings and recording files of the simulated interrogator are read with the same geometry and views
+@pytest.mark.parametrize('laserNum', [1, 3])
+def test_rawAndDasRecordings(simGui, tmp_path, laserNum):
+
+    dataAcq.storeDataToDisk(simGui, 100, 400, 1, laserNum, fileFormat='raw')
+    dataAcq.storeDataToDisk(simGui, 100, 400, 1, laserNum)
+    os.rename(os.path.join(str(tmp_path), 'recording.das'), os.path.join(str(tmp_path), 'sim.das'))
+    rawReader = dasReader.dasReader(str(tmp_path), laserNum=laserNum)
+    dasRecReader = dasReader.dasReader(os.path.join(str(tmp_path), 'sim.das'))
+
+    for attr in ['numChannels', 'numLasers', 'numChanns', 'numBuffers', 'numSamples']:
+        assert getattr(rawReader, attr) == getattr(dasRecReader, attr)
+    assert [view.laserITU for view in rawReader.getViews()] == [view.laserITU for view in dasRecReader.getViews()]
+    # Strided and fancy time indices read the same samples as the whole view
+    view = rawReader.getView(0, rawReader.numLasers - 1)
+    IQ = view[:, :]
+    np.testing.assert_array_equal(view[123:4567:7, 5:300], IQ[123:4567:7, 5:300])
+    np.testing.assert_array_equal(view[np.array([5, 3, 9999, -1]), 17], IQ[[5, 3, 9999, -1], 17])
+    with pytest.raises(IndexError):
+        rawReader.getChannSlice(1, 400)
+    with pytest.raises(IndexError):
+        view[rawReader.numSamples, 0]
+    rawReader.close()
+    dasRecReader.close()
+
+# Recording files of unknown layout or sample type are rejected
+@pytest.mark.parametrize('key, value', [('layout', 'CHANNEL_TIME'), ('sampleType', 'int8')])
+def test_unsupportedHeader(tmp_path, key, value):
+
+    header = {'numBoards': 1, 'firstChann': 1, 'lastChann': 32, 'digitizerChannels': ['I1', 'Q1'], 'layout': 'ADMA_INTERLEAVE_SAMPLES',
+              'sampleType': 'uint16', 'recordsPerBuffer': 10, 'buffersPerSecond': 1, 'bytesPerBuffer': 10*32*2*2}
+    header[key] = value
+    fileName = os.path.join(str(tmp_path), 'recording.das')
+    dasFile.dasFileWriter(fileName, header).close()
+
+    with pytest.raises(ValueError, match=value):
+        dasReader.dasReader(fileName)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:32:16 2026
+
+@author: H131339
+"""
+
+import pytest
+
+import dataAcq
+
+
+# Successive acquisitions of the same configuration keep the DMA buffers and the board configuration
+def test_sessionReuse(simGui):
+
+    dataAcq.storeDataToDisk(simGui, 100, 400, 1, 3, fileFormat=None)
+    session = dataAcq.getSession(simGui)
+    addresses = [buffer.addr for buffer in session.buffers[0]]
+    dataAcq.storeDataToDisk(simGui, 100, 400, 1, 3, fileFormat=None)
+
+    assert session.numArmed == 2 and session.numConfigured == 1 and not session.armed
+    assert [buffer.addr for buffer in session.buffers[0]] == addresses
+    # A different laser mask reconfigures the boards and changes the buffer size
+    dataAcq.storeDataToDisk(simGui, 100, 400, 1, 1, fileFormat=None)
+    assert session.numConfigured == 2 and session.bytesPerBuffer == session.buffers[0][0].size_bytes
+
+# Boards are aborted if posting the DMA buffers fails while arming
+def test_armFailure(simGui, monkeypatch):
+
+    board = simGui.DigitizerHandle.boardHandles[0]
+    aborted = []
+    abortAsyncRead = board.abortAsyncRead
+    # Only aborts following the failure are counted (beforeAsyncRead of the simulated board aborts as well)
+    def failPost(buffer, bufferLength):
+        aborted.clear()
+        raise RuntimeError('post failed')
+    def abort():
+        aborted.append(True)
+        abortAsyncRead()
+    monkeypatch.setattr(board, 'postAsyncBuffer', failPost)
+    monkeypatch.setattr(board, 'abortAsyncRead', abort)
+    session = dataAcq.getSession(simGui)
+
+    with pytest.raises(RuntimeError, match='post failed'):
+        session.arm(96, 320, 1000, 15, 4, 4)
+    assert not session.armed and len(aborted) == 1 and session.numArmed == 0
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:54:43 2026
+
+@author: H131339
+"""
+
+import os
+import socket
+import struct
+import threading
+import numpy as np
+import pytest
+
+import dasReader
+import dataAcq
+import IQtoPhase
+import strainStream
+import transforms
+
+
+# Function returns the strain of a raw recording computed at once (as strainStream: first laser ITU channel, decimated by a polyphaseDecimator)
+def getStrain(rawReader, board, decimation):
+
+    IQ = [view[:, :] for view in rawReader.getViews()[board*rawReader.numLasers:(board+1)*rawReader.numLasers]]
+    phaseData = IQtoPhase.getWeightedPhaseDataAll([x.real.astype(np.float64) for x in IQ], [x.imag.astype(np.float64) for x in IQ])
+    strainData = IQtoPhase.phaseToStrain(phaseData, strainStream.REFRACTIVE_INDEX, rawReader.header['laserITU'][board][0], rawReader.header['gaugeLength'])
+
+    return(transforms.polyphaseDecimator(decimation).update(strainData))
+
+# Strain streamed to a file and a socket while recording matches the strain of the raw recording computed at once
+@pytest.mark.parametrize('decimation', [1, 4])
+def test_strainOfRecording(simGui, tmp_path, decimation):
+
+    for interrogator in simGui.InterrogatorHandle.interrogators:
+        interrogator.enableDither(2, 10)
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    received = []
+    def receive():
+        [connection, address] = server.accept()
+        chunks = []
+        while True:
+            data = connection.recv(2**20)
+            if not data:
+                break
+            chunks.append(data)
+        received.append(b''.join(chunks))
+    thread = threading.Thread(target=receive)
+    thread.start()
+    strain = strainStream.strainStream(os.path.join(str(tmp_path), 'strain.das'), server.getsockname(), decimation)
+    dataAcq.storeDataToDisk(simGui, 1000, 1200, 2, 3, strain=strain)
+    thread.join()
+    server.close()
+
+    rawReader = dasReader.dasReader(str(tmp_path))
+    strainReader = dasReader.dasReader(os.path.join(str(tmp_path), 'strain.das'))
+    assert strainReader.header['fs'] == rawReader.header['fs']/decimation
+    assert strainReader.numSamples == rawReader.numSamples/decimation and strainReader.numChanns == rawReader.numChanns
+    assert strainReader.verifyChecksums() == []
+    strainData = strainReader.getView(0)[:, :]
+    reference = getStrain(rawReader, 0, decimation)
+    np.testing.assert_allclose(strainData, reference, rtol=0, atol=1e-5*np.max(np.abs(reference)))
+
+    # Socket stream: chunk header and strain of each buffer (same content as the file)
+    [data, offset, chunks] = [received[0], 0, []]
+    while offset < len(data):
+        [bufferNum, board, numSamples, numChanns] = struct.unpack_from(strainStream.CHUNK_HEADER_FORMAT, data, offset)
+        offset += struct.calcsize(strainStream.CHUNK_HEADER_FORMAT)
+        chunks.append(np.frombuffer(data, dtype=np.float32, count=numSamples*numChanns, offset=offset).reshape(numSamples, numChanns))
+        offset += numSamples*numChanns*4
+        assert board == 0 and bufferNum == len(chunks) - 1
+    np.testing.assert_array_equal(np.concatenate(chunks), strainData)
+    rawReader.close()
+    strainReader.close()
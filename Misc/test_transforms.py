@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:41:27 2026
+
+@author: H131339
+"""
+
+import numpy as np
+import pytest
+
+import dataAcq
+import IQlayout
+import IQtoPhase
+import transforms
+
+
+# Phase of the dither tone channels of a simulated interrogator (time, channel)
+def getPhase(simRecords, numRecords):
+
+    [I, Q] = IQlayout.getIQ(dataAcq.normalizeData(simRecords(numRecords, 16, 60)))
+
+    return(IQtoPhase.getPhaseData(I[0], Q[0]))
+
+# Streamed decimation matches decimate delayed by polyphaseDecimator.delay (away from the edges, where decimate extends the signal)
+@pytest.mark.parametrize('factor', [2, 5, 10])
+def test_polyphaseDecimatorMatchesDecimate(simRecords, factor):
+
+    phaseData = getPhase(simRecords, 4000)
+    decimator = transforms.polyphaseDecimator(factor)
+    streamed = np.concatenate([decimator.update(phaseData[k:k+333]) for k in range(0, 4000, 333)])
+    reference = transforms.decimate(phaseData, factor)
+    shift = decimator.delay // factor
+
+    assert decimator.delay % factor == 0
+    assert streamed.shape == reference.shape
+    np.testing.assert_allclose(streamed[2*shift:], reference[shift:-shift], rtol=0, atol=1e-9)
+
+# Blocks of any length give the same output as a single block
+def test_polyphaseDecimatorBlocks(simRecords):
+
+    phaseData = getPhase(simRecords, 4000)
+    decimator = transforms.polyphaseDecimator(7)
+    bounds = [0, 1, 8, 100, 2001, 4000]
+    streamed = np.concatenate([decimator.update(phaseData[bounds[k]:bounds[k+1]]) for k in range(len(bounds)-1)])
+
+    np.testing.assert_allclose(streamed, transforms.polyphaseDecimator(7).update(phaseData), rtol=0, atol=1e-12)
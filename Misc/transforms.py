@@ -5,55 +5,251 @@ Created on Mon Dec  4 10:12:13 2017
 @author: H131339
 """
 
+import functools
 import numpy as np
 import scipy.signal as signal
- 
+
+
+# Maximum number of window lengths kept in the window cache
+WINDOW_CACHE_SIZE = 8
+
+# Function returns the Blackman-Harris window of the given length together with its SEAFOM normalization factor and noise equivalent bandwidth
+# Windows are cached per length (returned arrays are read-only)
+@functools.lru_cache(maxsize=WINDOW_CACHE_SIZE)
+def getBlackmanHarris(length):
+
+    W = signal.windows.blackmanharris(length)
+    W.setflags(write=False)
+    normFact = length/np.sum(W)
+    neb = np.sqrt(np.size(W) * W.dot(W)/(np.sum(W)**2))
+
+    return(W, normFact, neb)
+
+# Function calculates the single-sided FFT (first half of the double-sided FFT) of a real signal along the given axis
+# The result is returned with the transformed axis moved to axis 0
+def halfSpectrum(sig, axis=0):
+
+    N = sig.shape[axis]
+    sigFFT = np.fft.rfft(sig, axis=axis)
+    sigFFT = np.moveaxis(sigFFT, axis, 0)[0:int(N/2)]
+
+    return(sigFFT)
 
 # Function calculates the power spectral density of a signal
-def psd(sig, fs):
+# sig can be a vector or a matrix holding one signal per column (axis=0) or row (axis=1)
+def psd(sig, fs, axis=0):
     
-    sigLen = sig.shape
-    sigFFT = np.fft.fft(sig)
-    sigFFT = sigFFT[0:int(sigLen[0]/2)]
-    P = (1/sigLen[0] * np.abs(sigFFT))**2
+    sigLen = sig.shape[axis]
+    sigFFT = halfSpectrum(sig, axis)
+    P = (1/sigLen * np.abs(sigFFT))**2
     P[1:-2] = 2*P[1:-2]
-    F = np.arange(0, fs/2, fs/sigLen[0])
+    F = np.arange(0, fs/2, fs/sigLen)
     
-    return(P, F)
+    return(np.moveaxis(P, 0, axis), F)
 
 # Function calculates the power spectral density of a signal similar to the Matlab native periodogram function
 # Note: Result needs to be divided by signal length in seconds in order to conserve the amplitude of a sinusoidal signal
-def periodogram(sig, fs):
+def periodogram(sig, fs, axis=0):
     
-    sigLen = sig.shape
-    sigFFT = np.fft.fft(sig)
-    sigFFT = sigFFT[0:int(sigLen[0]/2)]
-    P = (1/(sigLen[0]*fs)) * np.abs(sigFFT)**2
+    sigLen = sig.shape[axis]
+    sigFFT = halfSpectrum(sig, axis)
+    P = (1/(sigLen*fs)) * np.abs(sigFFT)**2
     P[1:-2] = 2*P[1:-2]
-    F = np.arange(0, fs/2, fs/sigLen[0])
+    F = np.arange(0, fs/2, fs/sigLen)
     
-    return(P,F)
+    return(np.moveaxis(P, 0, axis), F)
 
     
 # Function calculates the FFT of a signal according to the SEAFOM standard
-def seafom_fft(sig, fs):
+# sig has to hold fs samples (1 second) along the given axis
+def seafom_fft(sig, fs, axis=0):
 
     # Detrend data
-    sig = signal.detrend(sig)
+    sig = signal.detrend(sig, axis=axis)
     # Apply normalized Blackman-Harris window to data
-    W = signal.blackmanharris(fs)
-    normFact = fs/np.sum(W)
-    sig = normFact * np.multiply(sig, W)
+    [W, normFact, neb] = getBlackmanHarris(fs)
+    shape = [1]*sig.ndim
+    shape[axis] = -1
+    sig = normFact * np.multiply(sig, W.reshape(shape))
     # Calculate the FFT of the detrended and windowed data
-    N = np.size(sig)
-    sigFFT = np.fft.fft(sig)
+    N = sig.shape[axis]
+    sigFFT = halfSpectrum(sig, axis)
     # Normalize the FFT output by number of samples
     sigFFT = sigFFT/N
     # Convert from double-sided to single-sided FFT and take absolute value
-    sigFFT = np.abs(np.sqrt(2) * sigFFT[0:int(N/2)])
+    sigFFT = np.abs(np.sqrt(2) * sigFFT)
     # Correct for noise equivalent bandwidth of Blackman-Harris window
-    neb = np.sqrt(np.size(W) * W.dot(W)/(np.sum(W)**2))
     sigFFT = sigFFT / neb
     F = np.arange(0, fs/2, fs/N)
 
-    return(sigFFT, F)
+    return(np.moveaxis(sigFFT, 0, axis), F)
+
+# Function calculates the DFT coefficient at a single frequency (single-bin DFT) of all signals along the given axis at once
+# Equals the FFT bin of freq if freq is a multiple of fs/N, but needs only one pass over the data (matrix-vector product)
+def singleBinDFT(sig, fs, freq, axis=0):
+
+    N = sig.shape[axis]
+    phase = 2*np.pi*freq/fs*np.arange(N)
+    sigDFT = np.tensordot(np.cos(phase), sig, axes=([0], [axis])) - 1j*np.tensordot(np.sin(phase), sig, axes=([0], [axis]))
+
+    return(sigDFT)
+
+# Function returns the amplitude of a sinusoid of frequency freq in each signal along the given axis (see singleBinDFT)
+# For freq on an FFT bin this equals sqrt(2*P) of the power spectral density P calculated by psd
+def getToneAmplitude(sig, fs, freq, axis=0):
+
+    amplitude = 2*np.abs(singleBinDFT(sig, fs, freq, axis))/sig.shape[axis]
+
+    return(amplitude)
+
+
+# Spectral estimators usable by averagedPSD
+SPECTRAL_ESTIMATORS = {'psd': psd, 'periodogram': periodogram, 'seafom': seafom_fft}
+
+# Streaming averaged power spectral density (Welch method)
+# Consumes (time, channel) blocks of arbitrary length as they are acquired and keeps only one segment of data and the running sum of the spectra
+class averagedPSD:
+
+    # Sampling rate in Hz
+    fs = 0
+    # Number of samples per segment
+    segmentLen = 0
+    # Number of samples shared by consecutive segments
+    overlap = 0
+    # Spectral estimator applied to each segment (see SPECTRAL_ESTIMATORS)
+    estimator = None
+    # Optional function applied to each complete segment before the spectrum is calculated (e.g. conversion from I/Q to phase)
+    preprocess = None
+    # Segment buffer and number of samples it currently holds
+    segment = None
+    segmentFill = 0
+    # Sum of the spectra of all segments, number of segments and frequency vector
+    sumP = None
+    numSegments = 0
+    F = None
+
+    # Constructor
+    def __init__(self, fs, segmentLen, mode='periodogram', overlap=0, preprocess=None):
+
+        if overlap >= segmentLen:
+            raise ValueError("Segment overlap must be smaller than the segment length.")
+        self.fs = fs
+        self.segmentLen = segmentLen
+        self.overlap = overlap
+        self.estimator = SPECTRAL_ESTIMATORS[mode]
+        self.preprocess = preprocess
+
+    # Add block of shape (time, channel) to the estimate
+    # Returns list holding the spectrum of each segment completed by the block
+    def update(self, block):
+
+        if self.segment is None:
+            self.segment = np.empty((self.segmentLen,) + block.shape[1:], dtype=block.dtype)
+        spectra = []
+        n = 0
+        while n < block.shape[0]:
+            # Fill segment buffer
+            numSamples = min(block.shape[0] - n, self.segmentLen - self.segmentFill)
+            self.segment[self.segmentFill:self.segmentFill+numSamples] = block[n:n+numSamples]
+            self.segmentFill += numSamples
+            n += numSamples
+            if self.segmentFill < self.segmentLen:
+                break
+            # Calculate spectrum of complete segment and add it to the running sum
+            sig = self.segment if self.preprocess is None else self.preprocess(self.segment)
+            [P, self.F] = self.estimator(sig, self.fs)
+            if self.sumP is None:
+                self.sumP = np.zeros(P.shape)
+            self.sumP += P
+            self.numSegments += 1
+            spectra.append(P)
+            # Keep overlapping samples for the next segment
+            self.segment[0:self.overlap] = self.segment[self.segmentLen-self.overlap:]
+            self.segmentFill = self.overlap
+
+        return(spectra)
+
+    # Get the averaged spectrum and frequency vector
+    def getAverage(self):
+
+        if self.numSegments == 0:
+            raise ValueError("No complete segment has been processed.")
+
+        return(self.sumP/self.numSegments, self.F)
+
+
+# Number of filter taps per decimation factor of the anti-aliasing filter (as scipy.signal.resample_poly)
+DECIMATION_TAPS_PER_FACTOR = 20
+
+# Function returns the linear-phase low-pass FIR filter used to decimate by an integer factor
+# The filter only depends on the factor (cutoff at the Nyquist frequency of the decimated data); filters are cached per factor (returned array is read-only)
+@functools.lru_cache(maxsize=WINDOW_CACHE_SIZE)
+def getDecimationFilter(factor):
+
+    taps = signal.firwin(DECIMATION_TAPS_PER_FACTOR*factor + 1, 1/factor, window=('kaiser', 5.0))
+    taps.setflags(write=False)
+
+    return(taps)
+
+# Function decimates a signal by an integer factor along the given axis (zero phase, replaces scipy.signal.decimate(..., zero_phase=True))
+# All channels are filtered at once by a polyphase filter; the signal is extended linearly at its ends to avoid edge transients
+def decimate(sig, factor, axis=0):
+
+    if factor == 1:
+        return(sig)
+    sig = np.asarray(sig)
+    dtype = np.result_type(sig.dtype, np.float32)
+    taps = getDecimationFilter(factor).astype(dtype)
+
+    return(signal.resample_poly(sig.astype(dtype, copy=False), 1, factor, axis=axis, window=taps, padtype='line'))
+
+# Streaming polyphase decimation of (time, channel) blocks of arbitrary length
+# Keeps the last input samples as filter state, so that successive blocks give the same result as filtering all samples at once
+# The filter is causal: the output is delayed by (len(taps) - 1)/2 input samples (see delay)
+class polyphaseDecimator:
+
+    # Decimation factor
+    factor = 1
+    # Filter taps (see getDecimationFilter)
+    taps = None
+    # Delay of the output in input samples (output sample k corresponds to input sample k*factor - delay)
+    delay = 0
+    # Last input samples preceding the next block and number of input samples processed
+    history = None
+    numSamples = 0
+
+    # Constructor
+    def __init__(self, factor):
+
+        self.factor = factor
+        self.taps = getDecimationFilter(factor) if factor > 1 else None
+        self.delay = int((len(self.taps) - 1)/2) if factor > 1 else 0
+        self.reset()
+
+    # Restart with the next block
+    def reset(self):
+
+        self.history = None
+        self.numSamples = 0
+
+    # Returns the decimated block: filtered samples at all input sample numbers that are multiples of the factor
+    def update(self, block):
+
+        if self.factor == 1:
+            return(block)
+        dtype = np.result_type(block.dtype, np.float32)
+        numTaps = len(self.taps)
+        if self.history is None:
+            # Start in the steady state of the first sample
+            historyLen = numTaps - 1 + (-(numTaps - 1)) % self.factor
+            self.history = np.repeat(block[0:1].astype(dtype), historyLen, axis=0)
+        # The history is chosen such that the joint signal starts at a multiple of the factor
+        sig = np.concatenate([self.history, block.astype(dtype, copy=False)], axis=0)
+        historyLen = self.history.shape[0]
+        decimated = signal.upfirdn(self.taps.astype(dtype), sig, 1, self.factor, axis=0)
+        decimated = decimated[-(-historyLen//self.factor):-(-sig.shape[0]//self.factor)]
+        self.numSamples += block.shape[0]
+        historyLen = numTaps - 1 + (self.numSamples - (numTaps - 1)) % self.factor
+        self.history = sig[sig.shape[0]-historyLen:].copy()
+
+        return(decimated)
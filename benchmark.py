@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the acquisition-to-spectrum hot path
+
+Runs the processing steps shared by calibration and diagnostics (conversion
+of the digitizer output, I/Q de-interleaving, phase extraction and spectra)
+on synthetic backscatter from Misc/simFiber.py. No hardware or GUI needed.
+
+For every layout (number of DAS interrogators, channels and sampling rate)
+and processing step, the best time of several runs is reported as throughput
+in channel-samples per second (channels x samples per second of data, summed
+over all interrogators) together with the peak memory allocated by the step.
+
+Results can be stored as a baseline and later runs compared against it:
+
+    python benchmark.py --save                 # store baseline
+    python benchmark.py                        # compare against baseline
+    python benchmark.py --channels 4096 --fs 20000 --interrogators 2
+
+The script exits with status 1 if a step got slower or allocates more memory
+than the baseline by more than the given tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Misc'))
+import IQimbalance
+import IQlayout
+import IQtoPhase
+import simFiber
+import transforms
+
+
+# Default baseline file
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+# First channel of the synthetic data (channel offset is a multiple of 8, see dataAcq.getChannRange)
+FIRST_CHANN = 1000
+
+
+##################################################################################
+# SYNTHETIC DATA
+##################################################################################
+# Function generates one record length of raw digitizer output (both lasers) for each DAS interrogator
+# Returns list holding a uint16 matrix of shape (samples, 4*channels) per digitizer board
+def getRawData(numInterrogators, numChanns, fs, recLen):
+
+    cfg = simFiber.simConfig()
+    cfg.sensingRegions = [[0, FIRST_CHANN + numChanns]]
+    fiber = simFiber.fiberModel(cfg)
+    rawData = []
+    for i in range(numInterrogators):
+        instrument = simFiber.opcrSim.instrument(i, 'CRI-4400-0' + str(101+i), cfg.laserITU[i])
+        instrument.fs = fs
+        instrument.ampOn = 1
+        instrument.ditherAmp = 2
+        instrument.ditherFreq = 10
+        rawData.append(fiber.generateRecords(instrument, 15, FIRST_CHANN, numChanns, 0, int(recLen*fs)))
+
+    return(rawData)
+
+# Function converts the raw digitizer output to normalized data as returned by dataAcq.getData
+def convertData(rawData, dtype=np.float64):
+
+    data = []
+    for raw in rawData:
+        dataBlock = np.empty(raw.shape, dtype=dtype)
+        dataBlock[:] = raw
+        dataBlock -= 2**15
+        dataBlock /= 2**15
+        data.append(dataBlock)
+
+    return(data)
+
+# Function converts the raw digitizer output to signed 16 bit samples as returned by dataAcq.getData(..., dtype=np.int16)
+def convertSigned(rawData):
+
+    data = []
+    for raw in rawData:
+        data.append(np.bitwise_xor(raw, 2**15).view(np.int16))
+
+    return(data)
+
+# Function extracts the I/Q data of each laser from the data buffers (as in calibration and diagnostics)
+def deinterleave(data):
+
+    return(IQlayout.getIQ(data))
+
+
+##################################################################################
+# BENCHMARKED PROCESSING STEPS
+##################################################################################
+# Each step takes the prepared inputs of a layout and processes all channels
+def benchConvert(inputs):
+    convertData(inputs['rawData'])
+
+def benchConvertFloat32(inputs):
+    convertData(inputs['rawData'], np.float32)
+
+def benchConvertInt16(inputs):
+    convertSigned(inputs['rawData'])
+
+# The slices are views, so the I/Q data is copied to measure the cost of the strided access
+def benchDeinterleave(inputs):
+    [I, Q] = deinterleave(inputs['data'])
+    for i in range(len(I)):
+        np.ascontiguousarray(I[i])
+        np.ascontiguousarray(Q[i])
+
+def benchPhaseData(inputs):
+    I = inputs['I']
+    Q = inputs['Q']
+    for k in range(len(I)):
+        for j in range(I[k].shape[1]):
+            IQtoPhase.getPhaseData(I[k][:,j], Q[k][:,j])
+
+def benchWeightedPhaseData(inputs):
+    I = inputs['I']
+    Q = inputs['Q']
+    for k in range(0, len(I), 2):
+        for j in range(I[k].shape[1]):
+            IQtoPhase.getWeightedPhaseData(I[k:k+2], Q[k:k+2], j)
+
+def benchWeightedPhaseDataAll(inputs):
+    I = inputs['I']
+    Q = inputs['Q']
+    for k in range(0, len(I), 2):
+        IQtoPhase.getWeightedPhaseDataAll(I[k:k+2], Q[k:k+2])
+
+# Weighted phase of signed 16 bit samples (scaling folded into the quality factor)
+def benchWeightedPhaseDataAllInt16(inputs):
+    I = inputs['Iint16']
+    Q = inputs['Qint16']
+    for k in range(0, len(I), 2):
+        IQtoPhase.getWeightedPhaseDataAll(I[k:k+2], Q[k:k+2], 2**-15)
+
+def benchPsd(inputs):
+    for phaseData in inputs['weightedPhaseData']:
+        for j in range(phaseData.shape[1]):
+            transforms.psd(phaseData[:,j], inputs['fs'])
+
+def benchPeriodogram(inputs):
+    for phaseData in inputs['weightedPhaseData']:
+        for j in range(phaseData.shape[1]):
+            transforms.periodogram(phaseData[:,j], inputs['fs'])
+
+# Amplitude of the 10 Hz dither tone of all channels (single-bin DFT, see calibration.detectFiberEnd_fine)
+def benchToneAmplitude(inputs):
+    for phaseData in inputs['weightedPhaseData']:
+        transforms.getToneAmplitude(phaseData, inputs['fs'], 10)
+
+# I/Q imbalance correction of the raw digitizer output in place (see dataAcq.storeDataToDisk); repeated runs correct the same buffers again
+def benchIQcorrection(inputs):
+    corrector = IQimbalance.IQcorrector([0.05, -0.02], [-0.03, 0.01], [1.1, 0.95], 3, 2**-15)
+    for rawData in inputs['rawDataCopy']:
+        corrector.apply(rawData)
+
+def benchSeafomFFT(inputs):
+    for phaseData in inputs['weightedPhaseData']:
+        for j in range(phaseData.shape[1]):
+            transforms.seafom_fft(phaseData[:,j], inputs['fs'])
+
+# Benchmarked processing steps by name
+CASES = {
+    'convert': benchConvert,
+    'convertFloat32': benchConvertFloat32,
+    'convertInt16': benchConvertInt16,
+    'deinterleave': benchDeinterleave,
+    'getPhaseData': benchPhaseData,
+    'getWeightedPhaseData': benchWeightedPhaseData,
+    'getWeightedPhaseDataAll': benchWeightedPhaseDataAll,
+    'getWeightedPhaseDataAllInt16': benchWeightedPhaseDataAllInt16,
+    'psd': benchPsd,
+    'periodogram': benchPeriodogram,
+    'seafom_fft': benchSeafomFFT,
+    'toneAmplitude': benchToneAmplitude,
+    'IQcorrection': benchIQcorrection,
+}
+
+
+##################################################################################
+# BENCHMARK
+##################################################################################
+# Function prepares the inputs of all processing steps for the given layout
+def getInputs(numInterrogators, numChanns, fs, recLen):
+
+    inputs = {'fs': fs}
+    inputs['rawData'] = getRawData(numInterrogators, numChanns, fs, recLen)
+    inputs['rawDataCopy'] = [rawData.copy() for rawData in inputs['rawData']]
+    inputs['data'] = convertData(inputs['rawData'])
+    [inputs['I'], inputs['Q']] = deinterleave(inputs['data'])
+    [inputs['Iint16'], inputs['Qint16']] = deinterleave(convertSigned(inputs['rawData']))
+    inputs['weightedPhaseData'] = []
+    for k in range(0, len(inputs['I']), 2):
+        inputs['weightedPhaseData'].append(IQtoPhase.getWeightedPhaseDataAll(inputs['I'][k:k+2], inputs['Q'][k:k+2]))
+
+    return(inputs)
+
+# Function runs a processing step and returns its best run time in seconds and peak memory in bytes
+def runCase(case, inputs, repeats):
+
+    # Peak memory (measured in a separate run, since tracing slows down the step)
+    tracemalloc.start()
+    startMem = tracemalloc.get_traced_memory()[0]
+    case(inputs)
+    peakMem = tracemalloc.get_traced_memory()[1] - startMem
+    tracemalloc.stop()
+
+    runTime = np.inf
+    for i in range(repeats):
+        t = time.perf_counter()
+        case(inputs)
+        runTime = min(runTime, time.perf_counter() - t)
+
+    return(runTime, peakMem)
+
+# Function returns the key of a benchmark result
+def getKey(caseName, numInterrogators, numChanns, fs):
+    return(caseName + ' | ' + str(numInterrogators) + ' x ' + str(numChanns) + ' ch @ ' + str(fs) + ' Hz')
+
+# Function runs all selected processing steps for all layouts
+def runBenchmark(caseNames, interrogators, channels, fsList, recLen, repeats):
+
+    results = {}
+    for numInterrogators in interrogators:
+        for numChanns in channels:
+            for fs in fsList:
+                inputs = getInputs(numInterrogators, numChanns, fs, recLen)
+                channSamples = numInterrogators * numChanns * int(recLen*fs)
+                for caseName in caseNames:
+                    key = getKey(caseName, numInterrogators, numChanns, fs)
+                    try:
+                        [runTime, peakMem] = runCase(CASES[caseName], inputs, repeats)
+                    except Exception as e:
+                        print('{0:<60} failed: {1}'.format(key, e))
+                        continue
+                    results[key] = {'time': runTime, 'throughput': channSamples/runTime, 'peakMem': peakMem}
+                    print('{0:<60} {1:10.3e} ch*samples/s {2:9.1f} MB {3:9.3f} s'.format(key, channSamples/runTime, peakMem/2**20, runTime))
+                del inputs
+
+    return(results)
+
+# Function compares results against a baseline and returns the list of regressions
+def compareResults(results, baseline, tolerance):
+
+    regressions = []
+    print('\nComparison against baseline (throughput and peak memory relative to baseline)')
+    for key in results:
+        if key not in baseline:
+            continue
+        throughputRatio = results[key]['throughput'] / baseline[key]['throughput']
+        memRatio = (results[key]['peakMem'] + 1) / (baseline[key]['peakMem'] + 1)
+        flag = ''
+        if throughputRatio < 1 - tolerance or memRatio > 1 + tolerance:
+            flag = 'REGRESSION'
+            regressions.append(key)
+        print('{0:<60} {1:6.2f}x {2:6.2f}x {3}'.format(key, throughputRatio, memRatio, flag))
+
+    return(regressions)
+
+# Function returns a description of the machine running the benchmark
+def getMachineInfo():
+    return({'platform': platform.platform(), 'python': platform.python_version(), 'numpy': np.__version__, 'cpuCount': os.cpu_count()})
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmark of the acquisition-to-spectrum hot path on synthetic data')
+    parser.add_argument('--cases', default=','.join(CASES), help='comma-separated processing steps (default: all)')
+    parser.add_argument('--interrogators', default='1,2', help='comma-separated numbers of DAS interrogators')
+    parser.add_argument('--channels', default='512,2048', help='comma-separated numbers of channels (multiples of 32)')
+    parser.add_argument('--fs', default='5000,10000', help='comma-separated sampling rates in Hz')
+    parser.add_argument('--recLen', type=float, default=1, help='record length in seconds (seafom_fft requires 1 s)')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs per step (best run is reported)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file')
+    parser.add_argument('--save', action='store_true', help='store results as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative throughput loss or memory growth')
+    args = parser.parse_args(argv)
+
+    caseNames = args.cases.split(',')
+    for caseName in caseNames:
+        if caseName not in CASES:
+            parser.error('unknown case ' + caseName + ' (available: ' + ', '.join(CASES) + ')')
+    interrogators = [int(x) for x in args.interrogators.split(',')]
+    channels = [int(x) for x in args.channels.split(',')]
+    fsList = [int(x) for x in args.fs.split(',')]
+
+    results = runBenchmark(caseNames, interrogators, channels, fsList, args.recLen, args.repeats)
+
+    if args.save:
+        baseline = {'machine': getMachineInfo(), 'results': {}}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, 'r') as fid:
+                baseline = json.load(fid)
+        baseline['machine'] = getMachineInfo()
+        baseline['results'].update(results)
+        with open(args.baseline, 'w') as fid:
+            json.dump(baseline, fid, indent=2, sort_keys=True)
+        print('\nBaseline stored to ' + args.baseline)
+        return(0)
+
+    if not os.path.isfile(args.baseline):
+        print('\nNo baseline found (run with --save to store one)')
+        return(0)
+    with open(args.baseline, 'r') as fid:
+        baseline = json.load(fid)
+    if baseline['machine'] != getMachineInfo():
+        print('\nNote: baseline was recorded on a different machine or software version')
+    regressions = compareResults(results, baseline['results'], args.tolerance)
+    if len(regressions) > 0:
+        print('\n' + str(len(regressions)) + ' regression(s) found')
+        return(1)
+
+    return(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:40 2026
+
+@author: H131339
+"""
+
+import os
+import sys
+import pytest
+
+# Modules are imported flat from Misc and Alazar (as GUI.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Alazar'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Misc'))
+
+import simFiber
+
+# Tests run on the simulated backend (needs to be selected before dataAcq, digitizer and interrogator are imported)
+simFiber.enable()
+
+
+# Fixture returns function generating raw records (uint16, ADMA_INTERLEAVE_SAMPLES layout, laser 1 & 2) of a simulated interrogator
+# The dither tone sweeps the phase of all channels behind simFiber.config.ditherChann over more than a full circle
+# The simulation settings (generate.config) can be changed before the records are generated
+@pytest.fixture
+def simRecords():
+
+    fiber = simFiber.fiberModel(simFiber.simConfig())
+    instrument = simFiber.opcrSim.instrument(0, 'CRI-4400-0101', [35, 36])
+    instrument.launchEDFAcurrent = 800
+    instrument.ampOn = 1
+    instrument.ditherAmp = 3
+    instrument.ditherFreq = 170
+
+    def generate(numRecords, numChanns, channOffset=0):
+        return(fiber.generateRecords(instrument, 15, channOffset, numChanns, 0, numRecords))
+    generate.config = fiber.config
+    # Backscatter amplitude (full scale = 1) of each channel of a laser
+    generate.amplitude = lambda laser, channels: fiber.amplitude(instrument, laser, channels)
+
+    return(generate)
+
+# Fixture returns headless GUI of freshly created simulated interrogators and boards recording to a temporary directory
+# Buffers are delivered as fast as they can be generated
+@pytest.fixture
+def simGui(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(simFiber.config, 'realTime', False)
+    simFiber.reset()
+
+    return(simFiber.headlessGui(str(tmp_path)))
@@ -11,8 +11,10 @@ import sys
 import gc
 import scipy.signal as signal
 
+import channelPool
 import dataAcq
 import IQtoPhase
+import IQlayout
 import transforms as transforms
 
 
@@ -31,7 +33,7 @@ def AcousticNoiseFloorTest(gui):
         
         gui.textWindow.insert(tk.END, 'HAL Internal Test Procedure\n')
         gui.textWindow.see(tk.END)
-        noiseFloor = getAcousticNoiseFloor_HAL(gui, gui.diagnostics.acousticNoiseFloor.testDur, gui.diagnostics.acousticNoiseFloor.channRange[0], gui.diagnostics.acousticNoiseFloor.freqRange)
+        noiseFloor = getAcousticNoiseFloor_HAL(gui, gui.diagnostics.acousticNoiseFloor.testDur, gui.diagnostics.acousticNoiseFloor.channRange[0], gui.diagnostics.acousticNoiseFloor.freqRange, gui.diagnostics.acousticNoiseFloor.numWorkers)
 
         dataSize = noiseFloor.shape
         medianNoiseFloor = []
@@ -106,7 +108,7 @@ def AcousticNoiseFloorTest(gui):
 
 
 
-def getAcousticNoiseFloor_HAL(gui, testDur, channRange, freqRange):
+def getAcousticNoiseFloor_HAL(gui, testDur, channRange, freqRange, numWorkers=1):
     
      # Recording parameters
     recLen = 1 # Length in seconds for which a single acoustic noise floor measurement with be calculated
@@ -114,67 +116,51 @@ def getAcousticNoiseFloor_HAL(gui, testDur, channRange, freqRange):
     # Acoustic Noise Floor
     [firstChann, lastChann] = dataAcq.getChannRange(channRange[0], channRange[1])
     channOffset = [channRange[0] - firstChann, lastChann- channRange[1]]
+    numBoards = len(gui.DigitizerHandle.boardHandles)
+    numInterrogators = len(gui.InterrogatorHandle.interrogators)
+    numChanns = channRange[1] - channRange[0] + 1
     # Initialize matrix holding noise floor numbers
-    if len(gui.InterrogatorHandle.interrogators) == 1: # Single DAS interrogator data acquisition mode
-        noiseFloorMat = np.zeros((3, testDur, channRange[1] - channRange[0] + 1))
+    if numInterrogators == 1: # Single DAS interrogator data acquisition mode
+        noiseFloorMat = np.zeros((3, testDur, numChanns))
     else: # Dual DAS interrogator data acquisition mode
-        noiseFloorMat = np.zeros((7, testDur, channRange[1] - channRange[0] + 1))
+        noiseFloorMat = np.zeros((7, testDur, numChanns))
+
+    # Process the channels in a pool of worker processes if more than one worker is requested (pool is kept alive for the next test)
+    pool = None
+    if numWorkers > 1:
+        pool = channelPool.getPool(numWorkers)
+
+    # Stream data and calculate the noise floor of each channel for each laser, DAS interrogator and DAS interrogator assembly
+    # for each second of data while the next second is acquired
+    args = (numBoards, channOffset, gui.InterrogatorHandle.fs, freqRange)
+    print('Acquiring data (' + str(testDur) + ' s)')
+    try:
+        for [i, segment] in dataAcq.streamSegmentsPipelined(gui, firstChann, lastChann, testDur*recLen, 3, int(recLen*gui.InterrogatorHandle.fs)):
+            if pool is None:
+                noiseFloorMat[:, i, :] = channelPool.getNoiseFloorShard(segment, slice(0, numChanns), *args)
+            else:
+                noiseFloorMat[:, i, :] = pool.map(channelPool.getNoiseFloorShard, segment, numChanns, args)
+            print('Processed data (' + str(i+1) + '/' + str(testDur) + ')')
+            gui.progressBar.step(1/testDur)
+            gui.progressBar.update()
+    finally:
+        # Free the shared memory of the segments, the worker processes are kept
+        if pool is not None:
+            pool.releaseSharedMem()
+                  
+    return(noiseFloorMat)
 
-    
-    for i in range(0,testDur):
 
-        print('Acquiring data (' + str(i+1) + '/' + str(testDur) + ')')
-        gui.progressBar.step(1/testDur)
-        gui.progressBar.update()
 
-        # Acquire data
-        [data, firstChann, lastChann] = dataAcq.getData(gui, firstChann, lastChann, recLen, 3)
-        
-        dataSize = data[0].shape
-         # Extract I/Q data from data buffer for each laser
-        I = []
-        Q = []
-        for j in range(len(data)):
-            I.append(data[j][:, (channOffset[0]*4):(dataSize[1]-3-channOffset[1]*4):4])
-            I.append(data[j][:, (2+channOffset[0]*4):(dataSize[1]-1-channOffset[1]*4):4])
-            Q.append(data[j][:, (1+channOffset[0]*4):(dataSize[1]-2-channOffset[1]*4):4])
-            Q.append(data[j][:, (3+channOffset[0]*4):(dataSize[1]-channOffset[1]*4):4])
-    
-        dataSize = I[0].shape     
-        
-        for j in range(0,dataSize[1]):
-            
-            n = 0
-            # Get noise floor of individual lasers
-            for k in range(len(I)):
-                phaseData = IQtoPhase.getPhaseData(I[k][:,j],Q[k][:,j])
-                [P,F] = transforms.periodogram(phaseData, gui.InterrogatorHandle.fs)
-                P = 10*np.log10(P)
-                ind1 = np.nonzero(np.floor(F) == freqRange[0])
-                ind2 = np.nonzero(np.floor(F) == freqRange[1])
-                ind1 = np.ravel(ind1)
-                ind2 = np.ravel(ind2)
-                noiseFloorMat[n, i, j] = np.median(P[ind1[0]:ind2[0]]) 
-                n = n + 1
-              
-            # Get noise floor for each DAS interrogator (dual-laser)
-            for k in range(len(gui.InterrogatorHandle.interrogators)):
-                weightedPhaseData = IQtoPhase.getWeightedPhaseData([I[2*k], I[2*k+1]], [Q[2*k], Q[2*k+1]], j)
-                [P,F] = transforms.periodogram(weightedPhaseData, gui.InterrogatorHandle.fs)
-                P = 10*np.log10(P)
-                noiseFloorMat[n, i, j] = np.median(P[ind1[0]:ind2[0]])
-                n = n + 1
-
-            # Get noise floor for DAS interrogator assembly (quad-laser)
-            if len(gui.InterrogatorHandle.interrogators) == 2:
-                weightedPhaseData = IQtoPhase.getWeightedPhaseData(I, Q, j)
-                [P,F] = transforms.periodogram(weightedPhaseData, gui.InterrogatorHandle.fs)
-                P = 10*np.log10(P)
-                noiseFloorMat[n, i, j] = np.median(P[ind1[0]:ind2[0]])
-                
-                  
-    return(noiseFloorMat)
+# Function converts a segment holding the raw data of all boards side by side to the I/Q data of each laser
+def segmentToIQ(segment, numBoards, channOffset):
+
+    boardSize = int(segment.shape[1]/numBoards)
+    data = []
+    for j in range(numBoards):
+        data.append(dataAcq.normalizeData(segment[:, j*boardSize:(j+1)*boardSize]))
 
+    return(IQlayout.getIQ(data, 4, channOffset))
 
 
 ##################################################################################
@@ -192,58 +178,30 @@ def getAcousticNoiseFloor_SEAFOM(gui, testDur, channRange, freqRange):
     noiseFloorMat = [0, 0, 0]
     
     strainDataFFT_avg = np.zeros((3, int(gui.InterrogatorHandle.fs/2)))
+    numBoards = len(gui.DigitizerHandle.boardHandles)
+    numChanns = channRange[1] - channRange[0] + 1
+
+    # Function converts a segment of raw data to the phase of laser 1, laser 2 and the weighted phase (Laser 1 & 2), concatenated along the channel axis
+    def getPhaseSegment(segment):
+        [I, Q] = segmentToIQ(segment, numBoards, channOffset)
+        phaseData = [IQtoPhase.getPhaseData(I[0],Q[0]), IQtoPhase.getPhaseData(I[1],Q[1]), IQtoPhase.getWeightedPhaseDataAll(I, Q)]
+        return(np.concatenate(phaseData, axis=1))
+
+    # Stream data and accumulate the FFT according to the SEAFOM standard of each second of data while the next second is acquired
+    estimator = transforms.averagedPSD(gui.InterrogatorHandle.fs, int(recLen*gui.InterrogatorHandle.fs), 'seafom', preprocess=getPhaseSegment)
+    print('Acquiring data (' + str(testDur) + ' s)')
+    for [i, segment] in dataAcq.streamSegmentsPipelined(gui, firstChann, lastChann, testDur*recLen, 3, int(recLen*gui.InterrogatorHandle.fs)):
+        for P in estimator.update(segment):
+            print('Processed data (' + str(estimator.numSegments) + '/' + str(testDur) + ')')
+            gui.progressBar.step(1/testDur)
+            gui.progressBar.update()
 
-    for i in range(0,testDur):
-
-        print('Acquiring data (' + str(i+1) + '/' + str(testDur) + ')')
-        gui.progressBar.step(1/testDur)
-        gui.progressBar.update()
-
-        # Acquire data - Laser 1 & 2
-        [data, firstChann, lastChann] = dataAcq.getData(gui, firstChann, lastChann, recLen, 3)
-        dataSize = data[0].shape
-        
-         # Extract I/Q data from data buffer for each laser
-        I = []
-        Q = []
-        for j in range(len(data)):
-            I.append(data[j][:, (channOffset[0]*4):(dataSize[1]-3-channOffset[1]*4):4])
-            I.append(data[j][:, (2+channOffset[0]*4):(dataSize[1]-1-channOffset[1]*4):4])
-            Q.append(data[j][:, (1+channOffset[0]*4):(dataSize[1]-2-channOffset[1]*4):4])
-            Q.append(data[j][:, (3+channOffset[0]*4):(dataSize[1]-channOffset[1]*4):4])
-        
-        dataSize = I[0].shape
-        for j in range(0,dataSize[1]):
-            
-            # Noise FLoor - Laser 1
-            phaseData = IQtoPhase.getPhaseData(I[0][:,j],Q[0][:,j])
-            # Calculate the FFT according to the SEAFOM standard
-            [phaseDataFFT, F] = transforms.seafom_fft(phaseData, gui.InterrogatorHandle.fs)
-            # Convert from phase to pico strain
-            strainDataFFT = IQtoPhase.phaseToStrain(phaseDataFFT, refractiveInd, gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()].laserITU[0], gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()].gaugeLength)
-            strainDataFFT_avg[0,:] = strainDataFFT_avg[0,:] + strainDataFFT
-
-            # Noise FLoor - Laser 2
-            phaseData = IQtoPhase.getPhaseData(I[1][:,j],Q[1][:,j])
-            # Calculate the FFT according to the SEAFOM standard
-            [phaseDataFFT, F] = transforms.seafom_fft(phaseData, gui.InterrogatorHandle.fs)
-            # Convert from phase to pico strain
-            strainDataFFT = IQtoPhase.phaseToStrain(phaseDataFFT, refractiveInd, gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()].laserITU[1], gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()].gaugeLength)
-            strainDataFFT_avg[1,:] = strainDataFFT_avg[1,:] + strainDataFFT
-
-            # Noise FLoor - Laser 1 & 2
-            phaseData = IQtoPhase.getWeightedPhaseData(I, Q, j)
-            # Calculate the FFT according to the SEAFOM standard
-            [phaseDataFFT, F] = transforms.seafom_fft(phaseData, gui.InterrogatorHandle.fs)
-            # Convert from phase to pico strain
-            strainDataFFT = IQtoPhase.phaseToStrain(phaseDataFFT, refractiveInd, gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()].laserITU[0], gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()].gaugeLength)
-            strainDataFFT_avg[2,:] = strainDataFFT_avg[2,:] + strainDataFFT
-
-
-    # Normalize the summed FFTs 
-    strainDataFFT_avg[0,:] = strainDataFFT_avg[0,:]/(dataSize[1]*testDur)
-    strainDataFFT_avg[1,:] = strainDataFFT_avg[1,:]/(dataSize[1]*testDur)
-    strainDataFFT_avg[2,:] = strainDataFFT_avg[2,:]/(dataSize[1]*testDur)
+    # Average the FFTs over all channels and convert from phase to pico strain (Laser 1, Laser 2, Laser 1 & 2)
+    [phaseDataFFT_avg, F] = estimator.getAverage()
+    interrogator = gui.InterrogatorHandle.interrogators[gui.popupMenu_clockMode.current()]
+    laserITU = [interrogator.laserITU[0], interrogator.laserITU[1], interrogator.laserITU[0]]
+    for k in range(3):
+        strainDataFFT_avg[k,:] = IQtoPhase.phaseToStrain(np.mean(phaseDataFFT_avg[:, k*numChanns:(k+1)*numChanns], axis=1), refractiveInd, laserITU[k], interrogator.gaugeLength)
     # Convert the data to log scale
     strainDataFFT_avg[0,:] = 20*np.log10(strainDataFFT_avg[0,:])
     strainDataFFT_avg[1,:] = 20*np.log10(strainDataFFT_avg[1,:])
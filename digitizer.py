@@ -8,7 +8,12 @@ Created on Mon Nov  6 14:32:02 2017
 from __future__ import division
 from math import floor
 
-import atsapi as ats
+import simFiber
+# Use simulated digitizer boards if the simulated backend is selected
+if simFiber.isEnabled():
+    import atssim as ats
+else:
+    import atsapi as ats
 
 class digitizer:
     
@@ -29,10 +34,13 @@ class digitizer:
     status = 0
     # I/O Port input range
     IOinputRange = 2 # Set by default to 2V
+    # Persistent acquisition session holding the DMA buffers (see dataAcq.acqSession)
+    acqSession = None
     
     # Constructor
     def __init__(self, systemID=1, numInterrogators=1):
         
+        self.boardHandles = []
         for i in range(min(numInterrogators, ats.boardsInSystemBySystemID(systemID))):
             self.boardHandles.append(ats.Board(systemID, i+1))        
         for board in self.boardHandles:
@@ -8,6 +8,15 @@ Created on Thu Nov  9 09:10:34 2017
 import ctypes
 from math import floor
 
+import simFiber
+
+# Function loads opcr.dll, or the simulated DAS interrogators if the simulated backend is selected
+def loadOPCRdll():
+    if simFiber.isEnabled():
+        return(simFiber.opcr)
+    return(ctypes.WinDLL('opcr.dll'))
+
+
 class interrogatorAssembly:
 
     # List of interrogator objects
@@ -44,8 +53,12 @@ class interrogatorAssembly:
     # Constructor
     def __init__(self):
         
+        # Each assembly holds its own interrogators (__del__ empties the list)
+        self.interrogators = []
+        self.interrogatorNames = []
+
         # Load opcr.dll
-        self.OPCRdll = ctypes.WinDLL('opcr.dll')
+        self.OPCRdll = loadOPCRdll()
         
         # List unopened instruments
         unique_ID = ctypes.create_string_buffer(256)
@@ -249,7 +262,7 @@ class interrogatorAssembly:
             # Assign digitizer board number
             self.boardNum = boardNum
             # Load opcr.dll
-            self.OPCRdll = ctypes.WinDLL('opcr.dll')
+            self.OPCRdll = loadOPCRdll()
             errorCode = ctypes.c_int(5)
             # Open Communication
             self.opcr_handle = ctypes.c_void_p()
@@ -259,7 +272,8 @@ class interrogatorAssembly:
             if errorCode != 0:
                 print('Error: Could not establish communication with DAS interrogator ', self.name)
                 exit()
-            # Get Laser ITU Channels
+            # Get Laser ITU Channels (per instance, the class attribute is shared by all DAS interrogators)
+            self.laserITU = [0,0]
             self.laserITU[0] = self.getLaserITU(0)
             self.laserITU[1] = self.getLaserITU(1)
             print('Laser ITU Channel Pair: ' + str(self.laserITU[0]) + '/' + str(self.laserITU[1]))